@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+from game import Game
+from scripts.entities import Slime
+from scripts.physics import PhysicsWorld
+from scripts.spatial import SpatialHash
+from scripts.tilegrid import TileGrid
+from scripts.tilemap import PHYSICS_TILES
+from scripts.mapfile import MAP_EXT, write_map
+
+# a benchmark slower than its baseline by more than this is reported as a regression
+REGRESSION = 1.1
+
+def measure(fn, repeat=5, setup=None):
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def summary(times, per=1):
+    times = sorted(t / per for t in times)
+    return {'mean' : sum(times) / len(times), 'median' : times[len(times) // 2], 'min' : times[0], 'runs' : len(times)}
+
+def synthetic_map(width, height, decor, seed=0):
+    # rolling terrain: grass on the surface, stone below, with floating ledges and off-grid decor on top
+    rng = np.random.default_rng(seed)
+    surface = np.clip(height // 2 + np.cumsum(rng.integers(-1, 2, width)), 4, height - 4)
+    rows = np.arange(height)[:, None]
+    grid = TileGrid(PHYSICS_TILES)
+    grid.resize((0, 0, width, height))
+    grid.types[rows > surface] = grid.type_id('stone')
+    grid.types[rows == surface] = grid.type_id('grass')
+    for x, y, w in zip(rng.integers(0, width - 8, width // 20).tolist(), rng.integers(4, height - 4, width // 20).tolist(), rng.integers(2, 8, width // 20).tolist()):
+        if y < surface[x] - 4:
+            grid.types[y, x:x + w] = grid.type_id('grass')
+    grid.count = int(np.count_nonzero(grid.types))
+    grid.update_solid()
+
+    offgrid_tiles = []
+    for x in rng.uniform(0, width - 2, decor).tolist():
+        tile_type, variant = [('decor', 0), ('decor', 1), ('decor', 2), ('decor', 3), ('large_decor', 0), ('large_decor', 2)][rng.integers(6)]
+        offgrid_tiles.append({'type' : tile_type, 'variant' : variant, 'pos' : [x * 16, float(surface[int(x)] * 16 - 16)]})
+    return grid, offgrid_tiles, surface
+
+def load_synthetic(game, width, height, decor):
+    grid, offgrid_tiles, surface = synthetic_map(width, height, decor)
+    path = os.path.join(tempfile.mkdtemp(), 'synthetic' + MAP_EXT)
+    write_map(path, grid, 16, offgrid_tiles)
+    game.tilemap.load(path)
+    return surface
+
+def bench_tilemap(game, label, results, repeat):
+    tilemap = game.tilemap
+    x0, y0, x1, y1 = (v * tilemap.tile_size for v in tilemap.grid.bounds())
+    view = game.display.get_size()
+    surf = game.sprite_batch
+    # a left-to-right pan along the middle of the map, 60 frames
+    frames = [(int(x0 + (x1 - x0 - view[0]) * i / 59), int((y0 + y1 - view[1]) / 2)) for i in range(60)]
+
+    def pan():
+        for offset in frames:
+            surf.reset()
+            tilemap.render(surf, offset=offset)
+            surf.flush()
+    results[label + '/render_cold'] = summary(measure(pan, repeat, setup=tilemap.invalidate), per=len(frames))
+    results[label + '/render_warm'] = summary(measure(pan, repeat), per=len(frames))
+
+    variants = tilemap.grid.variants.copy()
+    def reset_variants():
+        tilemap.grid.variants[:] = 0
+        tilemap.invalidate()
+    results[label + '/autotile'] = summary(measure(tilemap.autotile, max(1, repeat // 5), setup=reset_variants))
+    tilemap.grid.variants[:] = variants
+
+    results[label + '/extract'] = summary(measure(lambda: tilemap.extract([('large_decor', 2), ('spawners', 0), ('spawners', 1)], keep=True), repeat))
+
+    rng = random.Random(0)
+    points = [(rng.uniform(x0, x1), rng.uniform(y0, y1)) for i in range(100000)]
+    def rects_around():
+        for pos in points:
+            tilemap.physics_rects_around(pos)
+    results[label + '/physics_rects_around'] = summary(measure(rects_around, repeat), per=len(points) / 1000)
+
+def spawn_slimes(game, count, spread=200):
+    rng = random.Random(1)
+    px, py = game.player.pos
+    return [Slime(game, (px - spread / 2 + rng.random() * spread, py - 40 + rng.random() * 40), (14, 10)) for i in range(count)]
+
+def bench_entities(game, results, repeat, counts):
+    tilemap = game.tilemap
+    for count in counts:
+        for batched in (False, True):
+            game.load_level(0)
+            slimes = spawn_slimes(game, count)
+            world = PhysicsWorld() if batched else None
+            if world is not None:
+                for slime in slimes:
+                    world.add(slime)
+                tick = lambda: world.step(tilemap, slimes)
+            else:
+                tick = lambda: [slime.update(tilemap) for slime in slimes]
+            def ticks():
+                for i in range(10):
+                    tick()
+            name = 'entities/update_' + str(count) + ('_batched' if batched else '')
+            results[name] = summary(measure(ticks, repeat), per=10)
+
+        # a pack on top of the player, and the same count spread over the level where few are in reach
+        for spread, suffix in ((24, ''), (2000, '_spread')):
+            game.load_level(0)
+            slimes = spawn_slimes(game, count, spread=spread)
+            player = game.player
+            enemies = SpatialHash()
+            for slime in slimes:
+                enemies.insert(slime)
+            def attack():
+                player.attacking = 45
+                player.immunity = 60
+                for slime in slimes:
+                    slime.hp = slime.max_hp = 10 ** 9
+                    slime.immunity = 0
+                    slime.dead = 0
+            def hit_test():
+                player.find_targets(enemies)
+                for slime in slimes:
+                    slime.post_update()
+            results['entities/slime_hits_' + str(count) + suffix] = summary(measure(hit_test, repeat * 4, setup=attack))
+
+def bench_effects(game, results, repeat):
+    rng = random.Random(2)
+    surf = game.sprite_batch
+    def fill():
+        game.particles.clear()
+        game.sparks.clear()
+        for i in range(2000):
+            game.particles.add('particle', (rng.random() * 192, rng.random() * 120), velocity=[rng.random() - 0.5, rng.random() - 0.5], frame=rng.randint(0, 7))
+        for i in range(500):
+            game.sparks.add((rng.random() * 192, rng.random() * 120), rng.random() * 6.28, 2 + rng.random() * 3)
+    def frames():
+        for i in range(10):
+            surf.reset()
+            game.particles.update()
+            game.sparks.update()
+            game.particles.render(surf)
+            game.sparks.render(game.display)
+            surf.flush()
+    results['effects/particles_2000_sparks_500'] = summary(measure(frames, repeat, setup=fill), per=10)
+
+    def fill_projectiles():
+        game.projectiles.clear()
+        game.sparks.clear()
+        for i in range(1000):
+            game.projectiles.add((rng.random() * 600 - 100, rng.random() * 300 - 100), (rng.choice((-1.5, 1.5)), 0))
+    def projectile_frames():
+        for i in range(10):
+            surf.reset()
+            game.projectiles.update()
+            game.projectiles.render(surf)
+            surf.flush()
+    results['effects/projectiles_1000'] = summary(measure(projectile_frames, repeat, setup=fill_projectiles), per=10)
+
+def bench_frame(results, repeat, level):
+    game = Game(audio=False, level=level, seed=0)
+    rng = random.Random(3)
+    inputs = [((rng.random() < 0.3, rng.random() < 0.5), ['jump'] if rng.random() < 0.03 else ['attack'] if rng.random() < 0.03 else []) for i in range(300)]
+    results['frame/level_' + str(level)] = summary(measure(lambda: game.simulate(len(inputs), inputs), repeat), per=len(inputs))
+
+def compare(results, baseline):
+    regressions = []
+    for name, result in results.items():
+        line = f'{name:44} {result["median"]:10.4f} ms'
+        if name in baseline:
+            ratio = result['median'] / baseline[name]['median'] if baseline[name]['median'] else 1
+            line += f'  x{ratio:.2f}'
+            if ratio > REGRESSION:
+                line += '  slower'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time the tilemap, physics, effects and render hot paths (medians in ms)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--quick', action='store_true', help='smaller synthetic map and entity counts')
+    parser.add_argument('--size', default='5000x500', help='synthetic map size in tiles, WxH')
+    parser.add_argument('--decor', type=int, default=10000, help='off-grid decor on the synthetic map')
+    parser.add_argument('--only', help='run only groups whose name contains this (maps, synthetic, entities, effects, frame)')
+    parser.add_argument('--out', help='write results to this .json file')
+    parser.add_argument('--baseline', help='compare against an earlier --out file')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    counts = (100, 500)
+    if args.quick:
+        width, height, args.decor, counts = min(width, 1000), min(height, 200), min(args.decor, 2000), (100,)
+
+    game = Game(rendering=False, audio=False, seed=0)
+    results = {}
+    groups = {
+        'maps' : lambda: [(game.load_level(level), bench_tilemap(game, 'map_' + str(level), results, args.repeat)) for level in range(game.level_count())],
+        'synthetic' : lambda: (load_synthetic(game, width, height, args.decor), bench_tilemap(game, f'synthetic_{width}x{height}', results, args.repeat)),
+        'entities' : lambda: bench_entities(game, results, args.repeat, counts),
+        'effects' : lambda: bench_effects(game, results, args.repeat),
+        'frame' : lambda: bench_frame(results, args.repeat, 0),
+    }
+    for name, run in groups.items():
+        if args.only is None or args.only in name:
+            run()
+
+    baseline = {}
+    if args.baseline:
+        f = open(args.baseline, 'r')
+        baseline = json.load(f)['results']
+        f.close()
+    regressions = compare(results, baseline)
+
+    if args.out:
+        f = open(args.out, 'w')
+        json.dump({'python' : sys.version.split()[0], 'results' : results}, f, indent=1)
+        f.close()
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,69 @@
+import os
+import glob
+import argparse
+
+from scripts.tilemap import Tilemap
+from scripts.mapfile import MAP_EXT
+from scripts.regions import REGION_EXT, REGION_SIZE, write_regions
+
+def same_map(a, b):
+    if a.tile_size != b.tile_size or sorted(a.grid) != sorted(b.grid) or len(a.offgrid_tiles) != len(b.offgrid_tiles):
+        return False
+    for tile_a, tile_b in zip(a.offgrid_tiles, b.offgrid_tiles):
+        if (tile_a['type'], tile_a['variant']) != (tile_b['type'], tile_b['variant']):
+            return False
+        # off-grid positions are stored as float32
+        if abs(tile_a['pos'][0] - tile_b['pos'][0]) > 0.01 or abs(tile_a['pos'][1] - tile_b['pos'][1]) > 0.01:
+            return False
+    return True
+
+def world_contents(tilemap):
+    # regions move marker tiles off the grid, so compare everything as pixel positioned tiles
+    contents = [(tile_type, variant, x * tilemap.tile_size, y * tilemap.tile_size) for x, y, tile_type, variant in tilemap.grid]
+    contents += [(tile['type'], tile['variant'], round(tile['pos'][0], 1), round(tile['pos'][1], 1)) for tile in tilemap.offgrid_tiles]
+    return sorted(contents)
+
+def convert_regions(path, out_dir=None, region_size=REGION_SIZE):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(out_dir if out_dir else os.path.dirname(path), stem + REGION_EXT)
+
+    source = Tilemap(None)
+    source.load(path)
+    write_regions(out_path, source.grid, source.tile_size, source.offgrid_tiles, region_size)
+
+    check = Tilemap(None)
+    check.load(out_path)
+    check.streamer.load_all()
+    if check.tile_size != source.tile_size or world_contents(source) != world_contents(check):
+        raise ValueError('region round trip mismatch for ' + path)
+
+    print(f'{path} -> {out_path} ({len(check.streamer.available)} regions of {region_size}x{region_size} tiles)')
+
+def convert(path, out_dir=None):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    out_path = os.path.join(out_dir if out_dir else os.path.dirname(path), stem + ('.json' if ext == MAP_EXT else MAP_EXT))
+
+    source = Tilemap(None)
+    source.load(path)
+    source.save(out_path)
+
+    check = Tilemap(None)
+    check.load(out_path)
+    if not same_map(source, check):
+        raise ValueError('round trip mismatch for ' + path)
+
+    print(f'{path} -> {out_path} ({os.path.getsize(path)} -> {os.path.getsize(out_path)} bytes)')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='convert maps between JSON and the binary ' + MAP_EXT + ' format')
+    parser.add_argument('paths', nargs='*', help='maps to convert, defaults to data/maps/*.json')
+    parser.add_argument('--out-dir', help='write converted maps here instead of next to the source')
+    parser.add_argument('--regions', action='store_true', help='write a ' + REGION_EXT + ' directory of region files for streaming instead')
+    parser.add_argument('--region-size', type=int, default=REGION_SIZE, help='region width and height in tiles')
+    args = parser.parse_args()
+
+    for path in args.paths or sorted(glob.glob('data/maps/*.json')):
+        if args.regions:
+            convert_regions(path, args.out_dir, args.region_size)
+        else:
+            convert(path, args.out_dir)
@@ -1,10 +1,17 @@
 import sys
+import time
 import pygame
 
-from scripts.utils import load_images
+from scripts.atlas import Atlas
 from scripts.tilemap import Tilemap
+from scripts.journal import Journal, OffgridDiff
+from scripts.autosave import Autosaver
 
 RENDER_SCALE = 2.0
+MAP_PATH = 'map.json'
+# autosave once this many cells changed, or every this many seconds while there are unsaved changes
+AUTOSAVE_CELLS = 256
+AUTOSAVE_INTERVAL = 10
 
 class Editor:
     def __init__(self):
@@ -16,12 +23,14 @@ class Editor:
 
         self.clock = pygame.time.Clock()
 
+        self.atlas = Atlas().build()
+
         self.assets = {
-            'decor' : load_images('tiles/decor'),
-            'grass' : load_images('tiles/grass'),
-            'large_decor' : load_images('tiles/large_decor'),
-            'stone' : load_images('tiles/stone'),
-            'spawners' : load_images('tiles/spawners')
+            'decor' : self.atlas.images('tiles/decor'),
+            'grass' : self.atlas.images('tiles/grass'),
+            'large_decor' : self.atlas.images('tiles/large_decor'),
+            'stone' : self.atlas.images('tiles/stone'),
+            'spawners' : self.atlas.images('tiles/spawners')
         }
 
         self.movement = [False, False, False, False]
@@ -29,9 +38,11 @@ class Editor:
         self.tilemap = Tilemap(self, tile_size=16)
 
         try:
-            self.tilemap.load('map.json')
+            self.tilemap.load(MAP_PATH)
         except FileNotFoundError:
             pass
+        self.autosaver = Autosaver(MAP_PATH, self.tilemap)
+        self.last_save = time.time()
 
         self.scroll = [0, 0]
 
@@ -43,6 +54,68 @@ class Editor:
         self.right_clicking = False
         self.shift = False
         self.ongrid = True
+        # fix up the painted cell and its neighbours as you go, T still runs a full pass
+        self.live_autotile = True
+
+        # brush paints a tile per frame, rect and select work on the dragged area, fill floods the clicked region
+        self.tool = 'brush'
+        self.drag_start = None
+        self.selection = None
+        self.clipboard = None
+        self.journal = Journal()
+
+    def save(self, full=False):
+        # snapshots here, the background writer diffs and writes
+        self.autosaver.save(self.tilemap, full)
+        self.journal.dirty = 0
+        self.last_save = time.time()
+
+    def drag_bounds(self, tile_pos):
+        return (min(self.drag_start[0], tile_pos[0]), min(self.drag_start[1], tile_pos[1]), max(self.drag_start[0], tile_pos[0]) + 1, max(self.drag_start[1], tile_pos[1]) + 1)
+
+    def view_bounds(self):
+        tile_size = self.tilemap.tile_size
+        return (int(self.scroll[0] // tile_size), int(self.scroll[1] // tile_size), int((self.scroll[0] + self.display.get_width()) // tile_size) + 1, int((self.scroll[1] + self.display.get_height()) // tile_size) + 1)
+
+    def change(self, bounds):
+        # autotiling reaches one cell past whatever was edited
+        return self.journal.change(self.tilemap, (bounds[0] - 1, bounds[1] - 1, bounds[2] + 1, bounds[3] + 1))
+
+    def copy(self):
+        if self.selection is None:
+            return
+        tile_size = self.tilemap.tile_size
+        origin = (self.selection[0] * tile_size, self.selection[1] * tile_size)
+        rect = pygame.Rect(origin[0], origin[1], (self.selection[2] - self.selection[0]) * tile_size, (self.selection[3] - self.selection[1]) * tile_size)
+        offgrid = [{'type' : tile['type'], 'variant' : tile['variant'], 'pos' : (tile['pos'][0] - origin[0], tile['pos'][1] - origin[1])} for tile in self.tilemap.offgrid_in(rect)]
+        self.clipboard = (self.tilemap.copy_tiles(self.selection), offgrid)
+
+    def paste(self, tile_pos):
+        if self.clipboard is None:
+            return
+        clip, offgrid = self.clipboard
+        height, width = clip[0].shape
+        tile_size = self.tilemap.tile_size
+        self.journal.begin()
+        with self.change((tile_pos[0], tile_pos[1], tile_pos[0] + width, tile_pos[1] + height)):
+            self.tilemap.paste_tiles(tile_pos, clip, autotile=self.live_autotile)
+        for tile in offgrid:
+            tile = {'type' : tile['type'], 'variant' : tile['variant'], 'pos' : (tile['pos'][0] + tile_pos[0] * tile_size, tile['pos'][1] + tile_pos[1] * tile_size)}
+            self.tilemap.add_offgrid(tile)
+            self.journal.push(OffgridDiff(tile, True))
+        self.journal.end()
+
+    def release(self, tile_pos, erase):
+        if self.drag_start is None:
+            return
+        bounds = self.drag_bounds(tile_pos)
+        if self.tool == 'rect':
+            with self.change(bounds):
+                self.tilemap.fill_rect(bounds, None if erase else self.tile_list[self.tile_group], self.tile_variant, autotile=self.live_autotile)
+        if self.tool == 'select':
+            self.selection = bounds
+        self.drag_start = None
+        self.journal.end()
 
     def run(self):
         while True:
@@ -67,29 +140,52 @@ class Editor:
                 self.display.blit(current_tile_img, mpos)
 
 
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type' : self.tile_list[self.tile_group], 'variant' : self.tile_variant, 'pos' : tile_pos}
-            if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                else:
-                    for tile in self.tilemap.offgrid_tiles.copy():
-                        tile_img = self.assets[tile['type']][tile['variant']]
-                        tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
-                        if tile_r.collidepoint(mpos):
-                            self.tilemap.offgrid_tiles.remove(tile)
+            if self.drag_start is not None:
+                bounds = self.drag_bounds(tile_pos)
+                pygame.draw.rect(self.display, (255, 255, 255), (bounds[0] * self.tilemap.tile_size - render_scroll[0], bounds[1] * self.tilemap.tile_size - render_scroll[1], (bounds[2] - bounds[0]) * self.tilemap.tile_size, (bounds[3] - bounds[1]) * self.tilemap.tile_size), 1)
+            elif self.selection is not None:
+                bounds = self.selection
+                pygame.draw.rect(self.display, (255, 255, 0), (bounds[0] * self.tilemap.tile_size - render_scroll[0], bounds[1] * self.tilemap.tile_size - render_scroll[1], (bounds[2] - bounds[0]) * self.tilemap.tile_size, (bounds[3] - bounds[1]) * self.tilemap.tile_size), 1)
+
+            if self.tool == 'brush':
+                if self.clicking and self.ongrid:
+                    with self.change((tile_pos[0], tile_pos[1], tile_pos[0] + 1, tile_pos[1] + 1)):
+                        self.tilemap.set_tile(tile_pos, self.tile_list[self.tile_group], self.tile_variant, autotile=self.live_autotile)
+                if self.right_clicking:
+                    with self.change((tile_pos[0], tile_pos[1], tile_pos[0] + 1, tile_pos[1] + 1)):
+                        removed = self.tilemap.remove_tile(tile_pos, autotile=self.live_autotile)
+                    if not removed:
+                        for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                            self.tilemap.remove_offgrid(tile)
+                            self.journal.push(OffgridDiff(tile, False))
+
+            if self.journal.dirty >= AUTOSAVE_CELLS or (self.journal.dirty and time.time() - self.last_save >= AUTOSAVE_INTERVAL):
+                self.save()
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    if self.journal.dirty:
+                        self.save()
+                    self.autosaver.flush()
                     pygame.quit()
                     sys.exit()
                 
                 if event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button in (1, 3):
+                        # everything until the button comes back up undoes as one operation
+                        self.journal.begin()
+                        if self.tool in ('rect', 'select'):
+                            self.drag_start = tile_pos
+                        if self.tool == 'fill':
+                            bounds = self.view_bounds()
+                            with self.change(bounds):
+                                self.tilemap.flood_fill(tile_pos, self.tile_list[self.tile_group] if event.button == 1 else None, self.tile_variant, bounds, autotile=self.live_autotile)
                     if event.button == 1:
                         self.clicking = True
-                        if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append({'type' : self.tile_list[self.tile_group], 'variant' : self.tile_variant, 'pos' : (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
+                        if not self.ongrid and self.tool == 'brush':
+                            tile = {'type' : self.tile_list[self.tile_group], 'variant' : self.tile_variant, 'pos' : (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])}
+                            self.tilemap.add_offgrid(tile)
+                            self.journal.push(OffgridDiff(tile, True))
                     if event.button == 3:
                         self.right_clicking = True
                     if self.shift:
@@ -107,8 +203,10 @@ class Editor:
                 if event.type == pygame.MOUSEBUTTONUP:
                     if event.button == 1:
                         self.clicking = False
+                        self.release(tile_pos, erase=False)
                     if event.button == 3:
                         self.right_clicking = False
+                        self.release(tile_pos, erase=True)
 
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_a:
@@ -122,9 +220,29 @@ class Editor:
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_t:
-                        self.tilemap.autotile()
+                        with self.journal.change(self.tilemap, self.tilemap.grid.bounds()):
+                            self.tilemap.autotile()
+                    if event.key == pygame.K_b:
+                        self.tool = 'brush'
+                    if event.key == pygame.K_r:
+                        self.tool = 'rect'
+                    if event.key == pygame.K_f:
+                        self.tool = 'fill'
+                    if event.key == pygame.K_e:
+                        self.tool = 'select'
+                    if event.mod & pygame.KMOD_CTRL:
+                        if event.key == pygame.K_z:
+                            self.journal.undo(self.tilemap)
+                        if event.key == pygame.K_y:
+                            self.journal.redo(self.tilemap)
+                        if event.key == pygame.K_c:
+                            self.copy()
+                        if event.key == pygame.K_v:
+                            self.paste(tile_pos)
+                    if event.key == pygame.K_l:
+                        self.live_autotile = not self.live_autotile
                     if event.key == pygame.K_o:
-                        self.tilemap.save('map.json')
+                        self.save(full=True)
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP:
@@ -1,107 +1,169 @@
 import os
 import sys
-import random
-import math
+import time
+import argparse
 
 import pygame
 
-from scripts.utils import load_image, load_images, Animation, DamageNumbers
+from scripts.utils import Animation
+from scripts.atlas import Atlas, SpriteBatch
 from scripts.entities import Player, Slime
 from scripts.tilemap import Tilemap
+from scripts.levels import LevelLoader
+from scripts.regions import REGION_EXT
+from scripts.spatial import SpatialHash
+from scripts.physics import PhysicsWorld
+from scripts.rng import RandomStreams
+from scripts.recording import Recording
+from scripts.mapfile import MAP_EXT
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.particle import Particles
+from scripts.spark import Sparks
+from scripts.projectile import Projectiles
+from scripts.audio import AudioManager
+from scripts.profiler import Profiler
+from scripts.present import PRESENTERS
+from scripts.postprocess import PostProcess, OutlineStage, IrisStage, ScreenshakeStage
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, rendering=True, audio=True, level=0, profile=False, profile_path=None, outline=False, presenter='scale', batched_physics=False, seed=None, record_path=None):
+        self.rendering = rendering
+        self.audio = audio
+        self.profiler = Profiler(enabled=profile)
+        self.profile_path = profile_path
+        self.record_path = record_path
+        self.rng = RandomStreams(seed)
+        # headless runs still need a video mode for convert(), so they get a dummy one
+        if not rendering:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        if not audio:
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
         pygame.init()
 
         pygame.display.set_caption("Test game")
-        self.screen = pygame.display.set_mode((960*1.5, 600*1.5))
         self.display = pygame.Surface((160*1.2, 100*1.2), pygame.SRCALPHA)
         self.display_2 = pygame.Surface((160*1.2, 100*1.2))
+        self.presenter = None
+        if rendering:
+            self.presenter = PRESENTERS[presenter]((960*1.5, 600*1.5), self.display_2.get_size())
+            self.screen = self.presenter.screen
+        else:
+            self.screen = pygame.display.set_mode((1, 1))
 
         self.clock = pygame.time.Clock()
 
         self.movement = [False, False]
 
-        self.assets = {
-            'decor' : load_images('tiles/decor'),
-            'grass' : load_images('tiles/grass'),
-            'large_decor' : load_images('tiles/large_decor'),
-            'stone' : load_images('tiles/stone'),
-            'background' : load_image('background.png'),
-            'clouds' : load_images('clouds'),
-            'blue_slime/jump' : Animation(load_images('entities/blue_slime/jump'), img_dur=4, loop=False),
-            'blue_slime/splash' : Animation(load_images('entities/blue_slime/splash'), img_dur=6, loop=False),
-            'blue_slime/idle' : Animation(load_images('entities/blue_slime/idle'), img_dur=6),
-            'blue_slime/death' : Animation(load_images('entities/blue_slime/death'), img_dur=6, loop=False),
-            'player/idle' : Animation(load_images('entities/player/idle'), img_dur=6),
-            'player/walk' : Animation(load_images('entities/player/run'), img_dur=6),
-            'player/run' : Animation(load_images('entities/player/run'), img_dur=3),
-            'player/attack_1' : Animation(load_images('entities/player/attack_1'), img_dur=5, loop=False),
-            'player/attack_2' : Animation(load_images('entities/player/attack_2'), img_dur=5, loop=False),
-            'player/attack_3' : Animation(load_images('entities/player/attack_3'), img_dur=5, loop=False),
-            'player/jump' : Animation(load_images('entities/player/jump')),
-            'player/dash' : Animation(load_images('entities/player/dash'), img_dur=4, loop=False),
-            'player/fall' : Animation(load_images('entities/player/fall')),
-            'player/slide' : Animation(load_images('entities/player/slide')),
-            'player/wall_slide' : Animation(load_images('entities/player/wall_slide')),
-            'experience/idle' : Animation(load_images('entities/experience')),
-            'particle/leaf' : Animation(load_images('particles/leaf'), img_dur=20, loop=False),
-            'particle/particle' : Animation(load_images('particles/particle'), img_dur=6, loop=False),
-        }
+        self.atlas = Atlas().build()
+        self.sprite_batch = SpriteBatch(self.display)
+
+        self.postprocess = PostProcess()
+        self.postprocess.register(OutlineStage(enabled=outline))
+        self.postprocess.register(IrisStage())
+        self.postprocess.register(ScreenshakeStage())
 
-        self.sfx = {
-            'jump' : pygame.mixer.Sound('data/sfx/jump.wav'),
-            'dash' : pygame.mixer.Sound('data/sfx/dash.wav'),
-            'hit' : pygame.mixer.Sound('data/sfx/hit.wav'),
-            'shoot' : pygame.mixer.Sound('data/sfx/shoot.wav'),
-            'ambience' : pygame.mixer.Sound('data/sfx/ambience.wav'),
+        self.assets = {
+            'decor' : self.atlas.images('tiles/decor'),
+            'grass' : self.atlas.images('tiles/grass'),
+            'large_decor' : self.atlas.images('tiles/large_decor'),
+            'stone' : self.atlas.images('tiles/stone'),
+            'background' : self.atlas.image('background.png'),
+            'clouds' : self.atlas.images('clouds'),
+            'projectile' : self.atlas.image('projectile.png'),
+            'blue_slime/jump' : Animation(self.atlas.images('entities/blue_slime/jump'), img_dur=4, loop=False),
+            'blue_slime/splash' : Animation(self.atlas.images('entities/blue_slime/splash'), img_dur=6, loop=False),
+            'blue_slime/idle' : Animation(self.atlas.images('entities/blue_slime/idle'), img_dur=6),
+            'blue_slime/death' : Animation(self.atlas.images('entities/blue_slime/death'), img_dur=6, loop=False),
+            'player/idle' : Animation(self.atlas.images('entities/player/idle'), img_dur=6),
+            'player/walk' : Animation(self.atlas.images('entities/player/run'), img_dur=6),
+            'player/run' : Animation(self.atlas.images('entities/player/run'), img_dur=3),
+            'player/attack_1' : Animation(self.atlas.images('entities/player/attack_1'), img_dur=5, loop=False),
+            'player/attack_2' : Animation(self.atlas.images('entities/player/attack_2'), img_dur=5, loop=False),
+            'player/attack_3' : Animation(self.atlas.images('entities/player/attack_3'), img_dur=5, loop=False),
+            'player/jump' : Animation(self.atlas.images('entities/player/jump')),
+            'player/dash' : Animation(self.atlas.images('entities/player/dash'), img_dur=4, loop=False),
+            'player/fall' : Animation(self.atlas.images('entities/player/fall')),
+            'player/slide' : Animation(self.atlas.images('entities/player/slide')),
+            'player/wall_slide' : Animation(self.atlas.images('entities/player/wall_slide')),
+            'experience/idle' : Animation(self.atlas.images('entities/experience')),
+            'particle/leaf' : Animation(self.atlas.images('particles/leaf'), img_dur=20, loop=False),
+            'particle/particle' : Animation(self.atlas.images('particles/particle'), img_dur=6, loop=False),
         }
 
-        self.sfx['jump'].set_volume(0.1)
-        self.sfx['dash'].set_volume(0.1)
-        self.sfx['hit'].set_volume(0.3)
-        self.sfx['shoot'].set_volume(0.1)
-        self.sfx['ambience'].set_volume(0.1)
+        # a fixed channel pool; triggers are merged per tick and played in Game.update
+        self.sfx = AudioManager()
+        if audio:
+            self.sfx.load('jump', 'data/sfx/jump.wav', volume=0.1, priority=1)
+            self.sfx.load('dash', 'data/sfx/dash.wav', volume=0.1, priority=1)
+            self.sfx.load('hit', 'data/sfx/hit.wav', volume=0.3, priority=2, max_voices=3)
+            self.sfx.load('shoot', 'data/sfx/shoot.wav', volume=0.1)
+            self.sfx.load('ambience', 'data/sfx/ambience.wav', volume=0.1)
 
-        self.clouds = Clouds(self.assets['clouds'], count=16)
+        self.clouds = Clouds(self.assets['clouds'], count=16, rng=self.rng.clouds)
 
         self.player = Player(self, (50, 50), (9, 16))
 
         self.tilemap = Tilemap(self, tile_size=16)
-
-        self.level = 0
+        # the next level is parsed in the background while the iris closes
+        self.levels = LevelLoader()
+
+        self.particles = Particles(self)
+        self.sparks = Sparks()
+        self.projectiles = Projectiles(self)
+        self.enemies = SpatialHash()
+        self.experiences = SpatialHash()
+        # slimes and experience orbs keep their kinematic state in shared arrays and move per archetype
+        self.physics = PhysicsWorld() if batched_physics else None
+
+        self.level = level
         self.load_level(self.level)
 
+        # every tick's input from here on, enough to replay the session from the same seed
+        self.recording = Recording(self.rng.seed, level, batched_physics) if record_path else None
+
         pygame.font.init()
 
         self.screenshake = 0
 
 
-    def load_level(self, map_id):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
-        self.leaf_spawners = []
-        for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
-            self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+    def level_path(self, map_id):
+        path = 'data/maps/' + str(map_id)
+        if os.path.isdir(path + REGION_EXT):
+            return path + REGION_EXT
+        if os.path.exists(path + MAP_EXT):
+            return path + MAP_EXT
+        return path + '.json'
+
+    def level_count(self):
+        return len({os.path.splitext(name)[0] for name in os.listdir('data/maps')})
+
+    def next_level(self):
+        return min(self.level + 1, self.level_count() - 1)
 
-        self.enemies = []
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
+    def load_level(self, map_id):
+        level = self.levels.get(self.level_path(map_id))
+        self.tilemap.use_level(level)
+        self.leaf_spawners = list(level.leaf_spawners)
+
+        self.enemies.clear()
+        self.experiences.clear()
+        if self.physics is not None:
+            self.physics.clear()
+        for spawner in level.spawners:
             match spawner['variant']:
                 case 0:
-                    self.player.pos = spawner['pos']
+                    self.player.pos = list(spawner['pos'])
                     self.player.air_time = 0
                 case 1:
-                    self.enemies.append(Slime(self, spawner['pos'], (14, 10)))
+                    self.add_entity(self.enemies, Slime(self, spawner['pos'], (14, 10)))
 
-        self.projectiles = []
-        self.particles = []
-        self.sparks = []
+        self.projectiles.clear()
+        self.particles.clear()
+        self.sparks.clear()
         self.circles = []
         self.texts = []
-        self.experiences = []
 # arekkususanhahontounikirekutesekushiidesu
         self.scroll = [0, 0]
         self.dead = 0
@@ -110,27 +172,109 @@ class Game:
         self.player.hp = self.player.max_hp
 
 
-    def run(self):
-        pygame.mixer.music.load('data/music.wav')
-        pygame.mixer.music.set_volume(0.5)
-        pygame.mixer.music.play(-1)
-
-        self.sfx['ambience'].play(-1)
-
-        while True:
-            self.display.fill((0, 0, 0, 0))
-            self.display_2.fill((0, 0, 0, 0))
-            
-            self.display_2.blit(self.assets['background'], (0, 0))
-
-            self.screenshake = max(0, self.screenshake - 1)
-
-            damage = False
-
+    def add_entity(self, group, entity):
+        group.insert(entity)
+        if self.physics is not None:
+            self.physics.add(entity)
+
+    def remove_entity(self, group, entity):
+        group.remove(entity)
+        if self.physics is not None:
+            self.physics.remove(entity)
+
+    def update_entities(self, group, movement=(0, 0)):
+        entities = group.query(*self.active_region())
+        if self.physics is not None:
+            kills = self.physics.step(self.tilemap, entities, movement)
+        else:
+            kills = [entity for entity in entities if entity.update(self.tilemap, movement)]
+        for entity in kills:
+            self.remove_entity(group, entity)
+
+    def play_sfx(self, name):
+        self.sfx.play(name)
+
+    def act(self, action):
+        match action:
+            case 'jump':
+                if self.player.jump():
+                    self.play_sfx('jump')
+            case 'dash':
+                self.player.dash()
+            case 'attack':
+                self.player.attack()
+            case 'run':
+                if self.player.air_time < 10:
+                    self.player.running = True
+            case 'walk':
+                self.player.running = False
+
+    def process_events(self):
+        actions = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if self.profile_path:
+                    self.profiler.export(self.profile_path)
+                if self.recording is not None:
+                    self.recording.save(self.record_path)
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT or event.key == pygame.K_a:
+                    self.movement[0] = True
+                if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
+                    self.movement[1] = True
+                if event.key == pygame.K_UP or event.key == pygame.K_w:
+                    actions.append('jump')
+                if event.key == pygame.K_x:
+                    actions.append('dash')
+                if event.key == pygame.K_c:
+                    actions.append('attack')
+                if event.key == pygame.K_v:
+                    print(f'player exp: {self.player.exp}')
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle_overlay()
+                if event.key == pygame.K_F4:
+                    self.profiler.export(self.profile_path or 'profile.csv')
+                if event.key == pygame.K_F5:
+                    self.postprocess.toggle('outline')
+                if event.key == pygame.K_LSHIFT:
+                    actions.append('run')
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_LEFT or event.key == pygame.K_a:
+                    self.movement[0] = False
+                if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
+                    self.movement[1] = False
+                if event.key == pygame.K_LSHIFT:
+                    actions.append('walk')
+        return actions
+
+    def step(self, actions=()):
+        if self.recording is not None:
+            self.recording.record(self.movement, actions)
+        for action in actions:
+            self.act(action)
+        self.update()
+
+    def active_region(self):
+        # entities are only simulated and drawn near the player
+        return (self.player.pos[0] - 120, self.player.pos[1] - 100, self.player.pos[0] + 120, self.player.pos[1] + 100)
+
+    def stream_rect(self):
+        # everything simulated or drawn this tick, which streamed maps must have resident
+        x0, y0, x1, y1 = self.active_region()
+        return pygame.Rect(x0, y0, x1 - x0, y1 - y0).union(pygame.Rect(self.scroll[0], self.scroll[1], self.display.get_width(), self.display.get_height()))
+
+    def update(self):
+        profiler = self.profiler
+        self.screenshake = max(0, self.screenshake - 1)
+
+        with profiler.scope('level'):
             if not len(self.enemies):
+                self.levels.preload(self.level_path(self.next_level()))
                 self.transition += 1
                 if self.transition > 30:
-                    self.level = min(self.level + 1, len(os.listdir('data/maps')) - 1)
+                    self.level = self.next_level()
                     self.load_level(self.level)
             if self.transition < 0:
                 self.transition += 1
@@ -142,138 +286,159 @@ class Game:
                 if self.dead > 40:
                     self.load_level(self.level)
 
-            self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 10
-            self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 10
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+        old_scroll = (self.scroll[0], self.scroll[1])
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 10
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 10
 
-            for rect in self.leaf_spawners:
-                if random.random() * 49999 < rect.width * rect.height:
-                    pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                    self.particles.append(Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
+        with profiler.scope('streaming'):
+            self.tilemap.stream(self.stream_rect(), (self.scroll[0] - old_scroll[0], self.scroll[1] - old_scroll[1]))
 
-            # self.clouds.update()
-            # self.clouds.render(self.display_2, offset=render_scroll)
+        for rect in self.leaf_spawners:
+            if self.rng.leaves.random() * 49999 < rect.width * rect.height:
+                pos = (rect.x + self.rng.leaves.random() * rect.width, rect.y + self.rng.leaves.random() * rect.height)
+                self.particles.add('leaf', pos, velocity=[-0.1, 0.3], frame=self.rng.leaves.randint(0, 20))
 
-            self.tilemap.render(self.display, offset=render_scroll)
+        # self.clouds.update()
 
-            for enemy in self.enemies.copy():
-                if abs(enemy.pos[0] - self.player.pos[0]) > 120 or abs(enemy.pos[1] - self.player.pos[1]) > 100:
-                    continue
-                kill = enemy.update(self.tilemap, (0, 0))
-                enemy.render(self.display, offset=render_scroll)
-                if kill:
-                    self.enemies.remove(enemy)
+        with profiler.scope('enemies'):
+            self.player.find_targets(self.enemies)
+            self.update_entities(self.enemies)
+
+        with profiler.scope('player'):
             if not self.dead:
                 self.player.update(self.tilemap, ((self.movement[1] - self.movement[0]) * (2 if self.player.running else 1) if self.player.attacking < 30 - 5 * self.player.combo else 0, 0))
-                self.player.render(self.display, offset=render_scroll)
-
-            # [[x, y], direction, timer]
-            for projectile in self.projectiles.copy():
-                projectile[0][0] += projectile[1]
-                projectile[2] += 1
-                img = self.assets['projectile']
-                self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                if self.tilemap.solid_check(projectile[0]):
-                    self.projectiles.remove(projectile)
-                    for i in range(4):
-                        self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
-                elif projectile[2] > 360:
-                    self.projectiles.remove(projectile)
-                elif abs(self.player.dashing) < 50:
-                    if self.player.rect().collidepoint(projectile[0]):
-                        self.projectiles.remove(projectile)
-                        self.player.hp = max(0, self.player.hp - 4)
-                        self.texts.append(DamageNumbers('-4', self.player.pos, color=(150, 0, 0)))
-                        self.sfx['hit'].play()
-                        self.screenshake = max(16, self.screenshake)
-                                       
-
-            for exp in self.experiences.copy():
-                kill = exp.update(self.tilemap)
-                if kill:
-                    self.experiences.remove(exp)
-                    continue
-                exp.render(self.display, offset=render_scroll)
-            for circle in self.circles:
-                pygame.draw.circle(self.display_2, circle['color'], (circle['pos'][0] - render_scroll[0], circle['pos'][1] - render_scroll[1]), circle["radius"], width=circle["width"])
+
+        with profiler.scope('projectiles'):
+            self.projectiles.update()
+
+        with profiler.scope('experience'):
+            self.update_entities(self.experiences)
+
+        with profiler.scope('effects'):
+            for circle in self.circles.copy():
                 circle['radius'] += 1
                 circle['width'] = (201 - circle['radius']) % 20
                 if circle['width'] <= 0:
                     self.circles.remove(circle)
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.display, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            display_mask = pygame.mask.from_surface(self.display)
-            display_silhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-            # for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                # self.display_2.blit(display_silhouette, offset)
-
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.display, offset=render_scroll)
-                if particle.type == 'leaf':
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                if kill:
-                    self.particles.remove(particle)
-
+            self.sparks.update()
+            self.particles.update()
             for text in self.texts.copy():
                 kill = text.update()
-                text.render(self.display, offset=render_scroll)
                 if kill:
                     self.texts.remove(text)
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                        self.movement[0] = True
-                    if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if event.key == pygame.K_UP or event.key == pygame.K_w:
-                        if self.player.jump():
-                            self.sfx['jump'].play()
-                    if event.key == pygame.K_x:
-                        self.player.dash()
-                    if event.key == pygame.K_c:
-                        self.player.attack()
-                    if event.key == pygame.K_v:
-                        print(f'player exp: {self.player.exp}')
-                    if event.key == pygame.K_LSHIFT and self.player.air_time < 10:
-                        self.player.running = True
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                        self.movement[1] = False
-                    if event.key == pygame.K_LSHIFT:
-                        self.player.running = False
-
-            if damage:
-                self.display.blit(damage, self.player.pos)
-                if self.player.hp == 0:
-                    self.dead += 1
+        with profiler.scope('audio'):
+            self.sfx.update()
+
+    def render(self):
+        profiler = self.profiler
+        self.display.fill((0, 0, 0, 0))
+        self.display_2.fill((0, 0, 0, 0))
+
+        self.display_2.blit(self.assets['background'], (0, 0))
+
+        render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+
+        # self.clouds.render(self.display_2, offset=render_scroll)
+
+        batch = self.sprite_batch
+        batch.reset()
+
+        with profiler.scope('render_tilemap'):
+            self.tilemap.render(batch, offset=render_scroll)
+
+        with profiler.scope('render_entities'):
+            active_region = self.active_region()
+            for enemy in self.enemies.query(*active_region):
+                enemy.render(batch, offset=render_scroll)
+            if not self.dead:
+                self.player.render(batch, offset=render_scroll)
+
+            self.projectiles.render(batch, offset=render_scroll)
+
+            for exp in self.experiences.query(*active_region):
+                exp.render(batch, offset=render_scroll)
+            batch.flush()
+
+        with profiler.scope('render_effects'):
+            for circle in self.circles:
+                pygame.draw.circle(self.display_2, circle['color'], (circle['pos'][0] - render_scroll[0], circle['pos'][1] - render_scroll[1]), circle["radius"], width=circle["width"])
+            batch.mark_dirty(self.sparks.render(self.display, offset=render_scroll))
+
+        with profiler.scope('render_particles'):
+            self.particles.render(batch, offset=render_scroll)
+
+        with profiler.scope('render_ui'):
+            for text in self.texts:
+                text.render(batch, offset=render_scroll)
+            batch.flush()
 
             max_hp_bar = pygame.Rect(10, 90, 50, 5)
             hp_bar = pygame.Rect(10, 90, self.player.hp / self.player.max_hp * 50, 5)
             pygame.draw.rect(self.display, (0, 0, 0), max_hp_bar)
             pygame.draw.rect(self.display, (150, 0, 0), hp_bar)
-            
-            if self.transition:
-                transition_surf = pygame.Surface(self.display.get_size())
-                pygame.draw.circle(transition_surf, (255, 255, 255), (self.display.get_width() // 2, self.display.get_height() // 2), (30 - abs(self.transition)) * 8)
-                transition_surf.set_colorkey((255, 255, 255))
-                self.display.blit(transition_surf, (0, 0))
-
-            self.display_2.blit(self.display, (0, 0))
-
-            screenshake_offset = (random.random() * self.screenshake - self.screenshake / 3, random.random() * self.screenshake - self.screenshake / 3)
-            self.screen.blit(pygame.transform.scale(self.display_2, (self.screen.get_size())), screenshake_offset)
-            pygame.display.update()
+
+        with profiler.scope('postprocess'):
+            self.postprocess.apply(self, self.display, self.display_2, batch.dirty)
+
+        if profiler.overlay:
+            profiler.render(self.display_2)
+
+        with profiler.scope('present'):
+            self.presenter.present(self.display_2, self.postprocess.offset)
+
+    def simulate(self, ticks, inputs=None):
+        # runs as fast as possible; inputs yields (movement, actions) per tick
+        inputs = iter(inputs) if inputs is not None else None
+        start = time.perf_counter()
+        for tick in range(ticks):
+            actions = ()
+            if inputs is not None:
+                movement, actions = next(inputs, ((False, False), ()))
+                self.movement = list(movement)
+            self.profiler.begin_frame()
+            self.step(actions)
+            if self.rendering:
+                self.render()
+            self.profiler.end_frame()
+        return time.perf_counter() - start
+
+    def run(self):
+        if self.audio:
+            pygame.mixer.music.load('data/music.wav')
+            pygame.mixer.music.set_volume(0.5)
+            pygame.mixer.music.play(-1)
+
+            self.sfx.loop('ambience')
+
+        while True:
+            self.profiler.begin_frame()
+            with self.profiler.scope('events'):
+                actions = self.process_events()
+            self.step(actions)
+            self.render()
+            self.profiler.end_frame()
             self.clock.tick(60)
 
-Game().run() 
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='simulate without a window or audio, as fast as possible')
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--level', type=int, default=0)
+    parser.add_argument('--outline', action='store_true', help='draw the silhouette outline around the sprite layer (F5 toggles)')
+    parser.add_argument('--present', choices=sorted(PRESENTERS), default='scale', help='how the low-res frame is scaled to the window')
+    parser.add_argument('--batched-physics', action='store_true', help='move slimes and experience orbs as batched arrays')
+    parser.add_argument('--seed', type=int, help='seed for the gameplay and effect random streams')
+    parser.add_argument('--record', help='write every tick of input to this file on exit, for replay.py')
+    parser.add_argument('--profile', action='store_true', help='time each phase of the frame (F3 shows the overlay, F4 exports)')
+    parser.add_argument('--profile-out', help='write frame timings to this .csv or .json file on exit')
+    args = parser.parse_args()
+
+    if args.headless:
+        game = Game(rendering=False, audio=False, level=args.level, profile=args.profile or bool(args.profile_out), batched_physics=args.batched_physics, seed=args.seed)
+        elapsed = game.simulate(args.ticks)
+        print(f'{args.ticks} ticks in {elapsed:.2f}s ({args.ticks / elapsed:.0f} ticks/s)')
+        if args.profile_out:
+            game.profiler.export(args.profile_out)
+    else:
+        Game(level=args.level, profile=args.profile or bool(args.profile_out), profile_path=args.profile_out, outline=args.outline, presenter=args.present, batched_physics=args.batched_physics, seed=args.seed, record_path=args.record).run()
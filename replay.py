@@ -0,0 +1,20 @@
+import argparse
+
+from game import Game
+from scripts.recording import Recording
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='feed a recorded session back into the game tick by tick')
+    parser.add_argument('recording')
+    parser.add_argument('--render', action='store_true', help='draw every frame (still unthrottled)')
+    parser.add_argument('--repeat', type=int, default=1, help='replay this many times and report each run')
+    parser.add_argument('--profile-out', help='write frame timings of the last run to this .csv or .json file')
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    for run in range(args.repeat):
+        game = Game(rendering=args.render, audio=False, level=recording.level, profile=bool(args.profile_out), batched_physics=recording.batched_physics, seed=recording.seed)
+        elapsed = game.simulate(len(recording), recording.inputs())
+        print(f'{len(recording)} ticks in {elapsed:.2f}s ({len(recording) / elapsed:.0f} ticks/s), level {game.level}, hp {game.player.hp}, exp {game.player.exp}, pos ({game.player.pos[0]:.1f}, {game.player.pos[1]:.1f})')
+    if args.profile_out:
+        game.profiler.export(args.profile_out)
@@ -0,0 +1,96 @@
+import os
+
+import pygame
+
+from scripts.utils import BASE_IMG_PATH
+
+class Atlas:
+    def __init__(self, base_path=BASE_IMG_PATH, sheet_size=(512, 512), padding=1):
+        self.base_path = base_path
+        self.sheet_size = sheet_size
+        self.padding = padding
+        self.sheets = []
+        # relative image path -> (sheet index, rect on that sheet)
+        self.rects = {}
+        self.sprites = {}
+
+    def build(self):
+        images = {}
+        for root, dirs, files in os.walk(self.base_path):
+            for name in files:
+                if name.endswith('.png'):
+                    path = os.path.relpath(os.path.join(root, name), self.base_path).replace(os.sep, '/')
+                    images[path] = pygame.image.load(os.path.join(root, name)).convert()
+
+        # shelf packing, tallest images first
+        sheet_rects = []
+        shelf = [0, 0, 0]
+        for path in sorted(images, key=lambda path: (-images[path].get_height(), path)):
+            w, h = images[path].get_size()
+            if not sheet_rects or shelf[0] + w > self.sheet_size[0]:
+                shelf = [0, shelf[1] + shelf[2], h + self.padding]
+            if not sheet_rects or shelf[1] + h > self.sheet_size[1]:
+                sheet_rects.append([])
+                shelf = [0, 0, h + self.padding]
+            self.rects[path] = (len(sheet_rects) - 1, pygame.Rect(shelf[0], shelf[1], w, h))
+            sheet_rects[-1].append(path)
+            shelf[0] += w + self.padding
+
+        for paths in sheet_rects:
+            sheet = pygame.Surface(self.sheet_size).convert()
+            sheet.fill((0, 0, 0))
+            for path in paths:
+                sheet.blit(images[path], self.rects[path][1])
+            sheet.set_colorkey((0, 0, 0))
+            self.sheets.append(sheet)
+
+        for path, (sheet, rect) in self.rects.items():
+            # subsurfaces share the sheet's pixels and colorkey
+            self.sprites[path] = self.sheets[sheet].subsurface(rect)
+        return self
+
+    def image(self, path):
+        return self.sprites[path]
+
+    def images(self, path):
+        prefix = path.rstrip('/') + '/'
+        return [self.sprites[name] for name in sorted(self.sprites) if name.startswith(prefix) and '/' not in name[len(prefix):]]
+
+class SpriteBatch:
+    def __init__(self, surf):
+        self.surf = surf
+        self.queue = []
+        # rects touched since the last reset, for post-processing that only looks at drawn regions
+        self.dirty = []
+
+    def get_width(self):
+        return self.surf.get_width()
+
+    def get_height(self):
+        return self.surf.get_height()
+
+    def get_size(self):
+        return self.surf.get_size()
+
+    def blit(self, source, dest, area=None):
+        self.queue.append((source, dest) if area is None else (source, dest, area))
+
+    def blits(self, blit_sequence, doreturn=False):
+        self.queue += blit_sequence
+
+    def fill(self, color, rect=None):
+        # fills keep their place in the draw order, so pending blits go out first
+        self.flush()
+        self.dirty.append(self.surf.fill(color, rect))
+
+    def mark_dirty(self, rects):
+        self.dirty += rects
+
+    def reset(self):
+        self.queue = []
+        self.dirty = []
+
+    def flush(self):
+        if self.queue:
+            self.dirty += self.surf.blits(self.queue)
+            self.queue = []
@@ -0,0 +1,89 @@
+import math
+
+import pygame
+
+class SoundEffect:
+    def __init__(self, sound, priority=0, max_voices=2):
+        self.sound = sound
+        self.priority = priority
+        self.max_voices = max_voices
+        self.length = sound.get_length()
+
+class AudioManager:
+    def __init__(self, channels=8, reserved=1, tick_rate=60):
+        self.sounds = {}
+        self.tick = 0
+        self.tick_rate = tick_rate
+        # sounds triggered this tick, each played at most once when the tick ends
+        self.queue = set()
+        self.stats = {'triggers' : 0, 'merged' : 0, 'played' : 0, 'stolen' : 0, 'dropped' : 0}
+
+        self.mixer = pygame.mixer.get_init() is not None
+        if self.mixer:
+            pygame.mixer.set_num_channels(channels)
+            # looping sounds get the reserved channels, one shots never take them
+            pygame.mixer.set_reserved(reserved)
+            self.loop_channels = [pygame.mixer.Channel(i) for i in range(reserved)]
+            self.channels = [pygame.mixer.Channel(i) for i in range(reserved, channels)]
+        else:
+            self.loop_channels = []
+            self.channels = [None] * (channels - reserved)
+        # what each pool channel is playing: [name, priority, end tick] or None
+        self.voices = [None] * len(self.channels)
+
+    def __contains__(self, name):
+        return name in self.sounds
+
+    def load(self, name, path, volume=1, priority=0, max_voices=2):
+        sound = pygame.mixer.Sound(path)
+        sound.set_volume(volume)
+        self.sounds[name] = SoundEffect(sound, priority, max_voices)
+
+    def play(self, name):
+        if name in self.sounds:
+            self.stats['triggers'] += 1
+            if name in self.queue:
+                self.stats['merged'] += 1
+            self.queue.add(name)
+
+    def loop(self, name):
+        for channel in self.loop_channels:
+            if not channel.get_busy():
+                channel.play(self.sounds[name].sound, loops=-1)
+                return channel
+
+    def stop(self):
+        if self.mixer:
+            pygame.mixer.stop()
+        self.queue = set()
+        self.voices = [None] * len(self.channels)
+
+    def start_voice(self, i, name, effect):
+        if self.channels[i] is not None:
+            self.channels[i].play(effect.sound)
+        self.voices[i] = [name, effect.priority, self.tick + math.ceil(effect.length * self.tick_rate)]
+        self.stats['played'] += 1
+
+    def update(self):
+        self.tick += 1
+        for i, voice in enumerate(self.voices):
+            if voice is not None and voice[2] <= self.tick:
+                self.voices[i] = None
+
+        # highest priority first, so a crowded pool drops the least important sounds
+        for name in sorted(self.queue, key=lambda name: (-self.sounds[name].priority, name)):
+            effect = self.sounds[name]
+            playing = [i for i, voice in enumerate(self.voices) if voice is not None and voice[0] == name]
+            if len(playing) >= effect.max_voices:
+                self.stats['dropped'] += 1
+                continue
+            if None in self.voices:
+                self.start_voice(self.voices.index(None), name, effect)
+                continue
+            i = min(range(len(self.voices)), key=lambda i: (self.voices[i][1], self.voices[i][2]))
+            if self.voices[i][1] < effect.priority:
+                self.stats['stolen'] += 1
+                self.start_voice(i, name, effect)
+            else:
+                self.stats['dropped'] += 1
+        self.queue = set()
@@ -0,0 +1,80 @@
+import os
+import queue
+import threading
+from collections import Counter
+
+import numpy as np
+
+from scripts.tilemap import save_map
+from scripts.mapfile import append_delta
+
+class Autosaver:
+    def __init__(self, path, tilemap, compact_cells=20000):
+        self.path = path
+        # past this many journaled changes the next save rewrites the whole map and drops the delta
+        self.compact_cells = compact_cells
+        self.delta_cells = 0
+        # the map as it is on disk, base file plus delta, which the next delta is diffed against
+        self.base = self.snapshot(tilemap) if os.path.exists(path) else None
+        self.requests = queue.Queue()
+        self.worker = None
+        self.error = None
+
+    def snapshot(self, tilemap):
+        # copies cheap enough for the UI thread, the writer does the rest
+        return tilemap.grid.copy(), [dict(tile) for tile in tilemap.offgrid_tiles], tilemap.tile_size
+
+    def save(self, tilemap, full=False):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.work, daemon=True)
+            self.worker.start()
+        self.requests.put((self.snapshot(tilemap), full))
+
+    def flush(self):
+        self.requests.join()
+
+    def work(self):
+        while True:
+            snapshot, full = self.requests.get()
+            try:
+                self.write(snapshot, full)
+            except Exception as e:
+                self.error = e
+            self.requests.task_done()
+
+    def write(self, snapshot, full):
+        record = None
+        if not full and self.base is not None and self.delta_cells < self.compact_cells and os.path.exists(self.path):
+            record = self.diff(self.base, snapshot)
+        if record is None:
+            grid, offgrid_tiles, tile_size = snapshot
+            save_map(self.path, grid, tile_size, offgrid_tiles)
+            self.delta_cells = 0
+        elif record['tiles'] or record['offgrid_added'] or record['offgrid_removed']:
+            append_delta(self.path, record)
+            self.delta_cells += len(record['tiles']) + len(record['offgrid_added']) + len(record['offgrid_removed'])
+        self.base = snapshot
+
+    def diff(self, old, new):
+        old_grid, old_offgrid, tile_size = old
+        new_grid, new_offgrid, new_tile_size = new
+        # type ids only ever get appended, so both snapshots share them unless the map was reloaded
+        if new_tile_size != tile_size or new_grid.type_names[:len(old_grid.type_names)] != old_grid.type_names:
+            return None
+
+        tiles = []
+        grids = [grid for grid in (old_grid, new_grid) if grid.types.size]
+        if grids:
+            bounds = (min(grid.origin[0] for grid in grids), min(grid.origin[1] for grid in grids), max(grid.bounds()[2] for grid in grids), max(grid.bounds()[3] for grid in grids))
+            old_types, old_variants = old_grid.read(bounds)
+            new_types, new_variants = new_grid.read(bounds)
+            ys, xs = np.nonzero((old_types != new_types) | (old_variants != new_variants))
+            for x, y, type_id, variant in zip(xs.tolist(), ys.tolist(), new_types[ys, xs].tolist(), new_variants[ys, xs].tolist()):
+                tiles.append([x + bounds[0], y + bounds[1], new_grid.type_names[type_id], variant])
+
+        key = lambda tile: (tile['type'], tile['variant'], tuple(tile['pos']))
+        old_keys = Counter(key(tile) for tile in old_offgrid)
+        new_keys = Counter(key(tile) for tile in new_offgrid)
+        removed = [{'type' : tile[0], 'variant' : tile[1], 'pos' : list(tile[2])} for tile in (old_keys - new_keys).elements()]
+        added = [{'type' : tile[0], 'variant' : tile[1], 'pos' : list(tile[2])} for tile in (new_keys - old_keys).elements()]
+        return {'tiles' : tiles, 'offgrid_removed' : removed, 'offgrid_added' : added}
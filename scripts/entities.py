@@ -1,12 +1,12 @@
 import math
-import random
 import pygame
 
-from scripts.particle import Particle
-from scripts.spark import Spark
 from scripts.utils import DamageNumbers
+from scripts.hitbox import TARGET_MARGIN, build_hitboxes
 
 class PhysicsEntity:
+    friction = 0
+
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
@@ -22,6 +22,11 @@ class PhysicsEntity:
 
         self.last_movement = [0, 0]
 
+        # set by SpatialHash.insert, kept up to date as the entity moves
+        self.spatial = None
+        # set by PhysicsWorld.add, pos and velocity are then views into its arrays
+        self.slot = None
+
     def rect(self):
         return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
 
@@ -30,58 +35,95 @@ class PhysicsEntity:
             self.action = action
             self.animation = self.game.assets[self.type + '/' + self.action].copy()
 
-    def update(self, tilemap, movement=(0, 0)):
-        self.collisions = {'up' : False, 'down' : False, 'right' : False, 'left' : False}
-        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
+    def pre_update(self, movement=(0, 0)):
+        pass
 
-        self.pos[0] += frame_movement[0]
+    def resolve_x(self, tilemap, dx, rects=None):
+        # pos has already been moved by dx, push it back out of any solid tile
+        self.collisions = {'up' : False, 'down' : False, 'right' : False, 'left' : False}
+        if rects is None:
+            rects = tilemap.physics_rects_around(self.pos)
+        if not rects:
+            return
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
+        for rect in rects:
             if entity_rect.colliderect(rect):
-                if frame_movement[0] > 0:
+                if dx > 0:
                     entity_rect.right = rect.left
                     self.collisions['right'] = True
-                if frame_movement[0] < 0:
+                if dx < 0:
                     entity_rect.left = rect.right
                     self.collisions['left'] = True
                 self.pos[0] = entity_rect.x
 
-        self.pos[1] += frame_movement[1]
+    def resolve_y(self, tilemap, dy, rects=None):
+        if rects is None:
+            rects = tilemap.physics_rects_around(self.pos)
+        if not rects:
+            return
         entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
+        for rect in rects:
             if entity_rect.colliderect(rect):
-                if frame_movement[1] > 0:
+                if dy > 0:
                     entity_rect.bottom = rect.top
                     self.collisions['down'] = True
-                if frame_movement[1] < 0:
+                if dy < 0:
                     entity_rect.top = rect.bottom
                     self.collisions['up'] = True
                 self.pos[1] = entity_rect.y
 
+    def apply_gravity(self):
+        self.velocity[1] = min(5, self.velocity[1] + 0.1)
+        if self.collisions['up'] or self.collisions['down']:
+            self.velocity[1] = 0
+
+    def apply_friction(self):
+        if self.velocity[0] > 0:
+            self.velocity[0] = max(self.velocity[0] - self.friction, 0)
+        else:
+            self.velocity[0] = min(self.velocity[0] + self.friction, 0)
+
+    def post_update(self, movement=(0, 0)):
         if movement[0] > 0:
             self.flip = False
         if movement[0] < 0:
             self.flip = True
 
-        self.velocity[1] = min(5, self.velocity[1] + 0.1)
-        
         self.last_movement = movement
 
-        if self.collisions['up'] or self.collisions['down']:
-            self.velocity[1] = 0
-        
         self.animation.update()
 
+        if self.spatial is not None:
+            self.spatial.move(self)
+
+    def update(self, tilemap, movement=(0, 0)):
+        # PhysicsWorld.step runs the same phases for a whole archetype at once
+        self.pre_update(movement)
+        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
+
+        self.pos[0] += frame_movement[0]
+        self.resolve_x(tilemap, frame_movement[0])
+        self.pos[1] += frame_movement[1]
+        self.resolve_y(tilemap, frame_movement[1])
+
+        self.apply_gravity()
+        kill = self.post_update(movement)
+        if self.friction:
+            self.apply_friction()
+        return kill
+
     def render_hp_bar(self, surf, hp, max_hp, anim_offset, offset=(0, 0)):
         max_hp_bar = pygame.Rect(self.pos[0] - offset[0] + anim_offset[0], self.pos[1] - offset[1] + anim_offset[1], 12, 2)
         hp_bar = pygame.Rect(self.pos[0] - offset[0] + anim_offset[0], self.pos[1] - offset[1] + anim_offset[1], hp / max_hp * 12, 2)
-        pygame.draw.rect(self.game.display, (0, 0, 0), max_hp_bar)
-        pygame.draw.rect(self.game.display, (150, 0, 0), hp_bar)
+        surf.fill((0, 0, 0), max_hp_bar)
+        surf.fill((150, 0, 0), hp_bar)
 
     def render(self, surf, anim_offset, offset=(0, 0)):
-        surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False), (self.pos[0] - offset[0] + anim_offset[0], self.pos[1] - offset[1] + anim_offset[1]))
+        surf.blit(self.animation.img(self.flip), (self.pos[0] - offset[0] + anim_offset[0], self.pos[1] - offset[1] + anim_offset[1]))
 
 class Player(PhysicsEntity):
+    friction = 0.1
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'player', pos, size)
         self.anim_offset = (-4, 0)
@@ -97,9 +139,14 @@ class Player(PhysicsEntity):
         self.exp = 0
         self.combo = 0
         self.damage = 5
+        # hit shapes for every frame of every player animation, a swing's first tick still shows the previous action
+        self.hitboxes = {key.split('/')[1] : build_hitboxes(animation) for key, animation in game.assets.items() if key.startswith('player/')}
+        # enemies that may be in reach this tick and the hit shape they are tested against, see find_targets
+        self.targets = ()
+        self.target_hitbox = None
 
-    def update(self, tilemap, movement=(0, 0)):
-        super().update(tilemap, movement=movement)
+    def post_update(self, movement=(0, 0)):
+        super().post_update(movement)
 
         self.air_time += 1
         self.immunity = max(0, self.immunity - 1)
@@ -143,10 +190,10 @@ class Player(PhysicsEntity):
 
         if abs(self.dashing) in {60, 50}:
             for i in range(20):
-                angle = random.random() * math.pi * 2
-                speed = random.random() * 0.5 + 0.5
+                angle = self.game.rng.effects.random() * math.pi * 2
+                speed = self.game.rng.effects.random() * 0.5 + 0.5
                 pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                # self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+                # self.game.particles.add('particle', self.rect().center, velocity=pvelocity, frame=self.game.rng.effects.randint(0, 7))
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)
         if self.dashing < 0:
@@ -155,8 +202,8 @@ class Player(PhysicsEntity):
             self.velocity[0] = abs(self.dashing) / self.dashing * 8
             if abs(self.dashing) == 51:
                 self.velocity[0] *= 0.1
-            pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-            # self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+            pvelocity = [abs(self.dashing) / self.dashing * self.game.rng.effects.random() * 3, 0]
+            # self.game.particles.add('particle', self.rect().center, velocity=pvelocity, frame=self.game.rng.effects.randint(0, 7))
 
         if self.attacking > 0:
             self.attacking = max(0, self.attacking - 1)
@@ -164,12 +211,26 @@ class Player(PhysicsEntity):
             self.combo = 0
         if self.combo == 2 and self.attacking < 30 - 5 * self.combo:
             self.combo = 0
-
-        if self.velocity[0] > 0:
-            self.velocity[0] = max(self.velocity[0] - 0.1, 0)
-        else:
-            self.velocity[0] = min(self.velocity[0] + 0.1, 0)
     
+    def hitbox(self):
+        return self.hitboxes[self.action][self.flip][int(self.animation.frame / self.animation.img_duration)]
+
+    def find_targets(self, enemies):
+        # one broadphase query per tick, only enemies inside it run the exact mask test
+        self.targets = ()
+        if self.attacking >= 40:
+            hitbox = self.target_hitbox = self.hitbox()
+            x = self.pos[0] - hitbox.offset[0]
+            y = self.pos[1] - hitbox.offset[1]
+            self.targets = set(enemies.query(x - hitbox.rect.right - TARGET_MARGIN, y - hitbox.rect.bottom - TARGET_MARGIN, x - hitbox.rect.left + TARGET_MARGIN, y - hitbox.rect.top + TARGET_MARGIN))
+
+    def hits(self, entity):
+        hitbox = self.target_hitbox
+        offset = (int(entity.pos[0] - self.pos[0] + hitbox.offset[0]), int(entity.pos[1] - self.pos[1] + hitbox.offset[1]))
+        if not hitbox.rect.move(offset).colliderect(entity.animation.rect(entity.flip)):
+            return False
+        return entity.animation.mask(entity.flip).overlap_area(hitbox.mask, offset) > 2
+
     def render(self, surf, offset=(0, 0)):
         if self.attacking < 30 - 5 * self.combo:
             super().render(surf, self.anim_offset, offset=offset)
@@ -195,7 +256,7 @@ class Player(PhysicsEntity):
     
     def dash(self):
         if not self.dashing:
-            self.game.sfx['dash'].play()
+            self.game.play_sfx('dash')
             if self.flip:
                 self.dashing = -60
             else:
@@ -209,10 +270,10 @@ class Player(PhysicsEntity):
             self.damage = 5 if self.combo < 2 else 8
             self.game.screenshake = max(16, self.game.screenshake)
             for i in range(3):
-                self.game.sparks.append(Spark((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1] - random.randint(0, 7)), random.random() * math.pi / 6 + (math.pi if self.flip else 0), 1 + random.random() * 0.5))
+                self.game.sparks.add((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1] - self.game.rng.effects.randint(0, 7)), self.game.rng.effects.random() * math.pi / 6 + (math.pi if self.flip else 0), 1 + self.game.rng.effects.random() * 0.5)
         if False:
-            self.game.sparks.append(Spark((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1]), 0, 2 + random.random() * 0.5))
-            self.game.sparks.append(Spark((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1]), math.pi, 2 + random.random() * 0.5))
+            self.game.sparks.add((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1]), 0, 2 + self.game.rng.effects.random() * 0.5)
+            self.game.sparks.add((self.rect().bottomright[0] - (20 if self.flip else -12), self.rect().bottomright[1]), math.pi, 2 + self.game.rng.effects.random() * 0.5)
 
 class Slime(PhysicsEntity):
     def __init__(self, game, pos, size):
@@ -227,7 +288,7 @@ class Slime(PhysicsEntity):
         self.dead = 0
         self.exp = 2
 
-    def update(self, tilemap, movement=(0, 0)):
+    def pre_update(self, movement=(0, 0)):
         if not self.dead:
             if abs(self.jumping) > 20:
                 self.velocity[0] = abs(self.jumping) / self.jumping * 0.5
@@ -235,7 +296,7 @@ class Slime(PhysicsEntity):
                     self.jumping = min(0, self.jumping + 1)
                 else:
                     self.jumping = max(0, self.jumping - 1)
-            elif self.ground_time > 5 and random.random() < (0.01 if abs(self.game.player.pos[0] - self.pos[0]) > 5 * 16 else 0.05) and self.game.player.pos[0] != self.pos[0]:
+            elif self.ground_time > 5 and self.game.rng.ai.random() < (0.01 if abs(self.game.player.pos[0] - self.pos[0]) > 5 * 16 else 0.05) and self.game.player.pos[0] != self.pos[0]:
                 self.jumping = abs(self.game.player.pos[0] - self.pos[0]) // (self.game.player.pos[0] - self.pos[0]) * 60
                 self.velocity[0] = self.jumping / abs(self.jumping) * 2
                 self.velocity[1] = -2
@@ -243,7 +304,8 @@ class Slime(PhysicsEntity):
             else:
                 self.velocity[0] = 0
 
-        super().update(tilemap, movement=movement)
+    def post_update(self, movement=(0, 0)):
+        super().post_update(movement)
 
         if self.dead:
             self.set_action('death')
@@ -264,44 +326,38 @@ class Slime(PhysicsEntity):
 
         if self.immunity:
             self.immunity = max(0, self.immunity - 1)
-        if self.game.player.attacking >= 40 and not self.immunity:
-            e_mask = pygame.mask.from_surface(pygame.transform.flip(self.animation.img(), self.flip, False))
-            p_mask = pygame.mask.from_surface(pygame.transform.flip(self.game.player.animation.img(), self.game.player.flip, False))
-            offset = (-17, -16) if not self.game.player.flip else (0, -16)
-            # if self.game.player.attacking >= 25:
-                # print(f"enemy: {self.pos}  player: {self.game.player.pos}")
-                # print(e_mask.overlap_area(p_mask, (int(self.pos[0] - self.game.player.pos[0] + offset[0]), int(self.pos[1] - self.game.player.pos[1] + offset[1]))))
-            if e_mask.overlap_area(p_mask, (int(self.pos[0] - self.game.player.pos[0] + offset[0]), int(self.pos[1] - self.game.player.pos[1] + offset[1]))) > 2:
+        if self.game.player.attacking >= 40 and not self.immunity and self in self.game.player.targets:
+            if self.game.player.hits(self):
                 self.game.circles.append({"radius" : 5, "width" : 5, 'pos' : self.rect().center, 'color' : (255, 255, 255)})
                 self.game.texts.append(DamageNumbers(str(self.game.player.damage), self.pos))
                 self.hp = max(0, self.hp - self.game.player.damage)
-                self.game.sfx['hit'].play()
+                self.game.play_sfx('hit')
                 self.immunity = 20
                 if self.hp == 0:
                     self.dead += 1
                     for i in range(self.exp):
-                        self.game.experiences.append(Experience(self.game, self.pos))
+                        self.game.add_entity(self.game.experiences, Experience(self.game, self.pos))
 
         if abs(self.game.player.dashing) < 50 and not self.game.player.immunity:
             if self.rect().colliderect(self.game.player.rect()):
                 self.game.player.immunity = 20
                 self.game.screenshake = max(16, self.game.screenshake)
-                self.game.sfx['hit'].play()
+                self.game.play_sfx('hit')
                 self.game.player.velocity[0] = 2 if self.game.player.flip else -2
                 for i in range(5):
-                    angle = random.random() * math.pi - (math.atan((self.game.player.pos[1] - self.pos[1]) / (self.game.player.pos[0] - self.pos[0])) if self.game.player.pos[0] != self.pos[0] else 0)
-                    speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, angle, 2 + random.random(), color=(100, 200, 255)))
-                    self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+                    angle = self.game.rng.effects.random() * math.pi - (math.atan((self.game.player.pos[1] - self.pos[1]) / (self.game.player.pos[0] - self.pos[0])) if self.game.player.pos[0] != self.pos[0] else 0)
+                    speed = self.game.rng.effects.random() * 5
+                    self.game.sparks.add(self.rect().center, angle, 2 + self.game.rng.effects.random(), color=(100, 200, 255))
+                    self.game.particles.add('particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=self.game.rng.effects.randint(0, 7))
                 self.game.player.hp = max(0, self.game.player.hp - self.damage)
                 self.game.texts.append(DamageNumbers(str(self.damage), self.game.player.pos, color=(150, 0, 0)))
                 if self.game.player.hp == 0:
                     self.game.dead += 1
                     for i in range(30):
-                        angle = random.random() * math.pi * 2
-                        speed = random.random() * 5
-                        self.game.sparks.append(Spark(self.game.player.rect().center, angle, 2 + random.random()))
-                        self.game.particles.append(Particle(self.game, 'particle', self.game.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+                        angle = self.game.rng.effects.random() * math.pi * 2
+                        speed = self.game.rng.effects.random() * 5
+                        self.game.sparks.add(self.game.player.rect().center, angle, 2 + self.game.rng.effects.random())
+                        self.game.particles.add('particle', self.game.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=self.game.rng.effects.randint(0, 7))
  
         if self.velocity[1] == 5:
             return True
@@ -316,12 +372,12 @@ class Experience(PhysicsEntity):
         super().__init__(game, 'experience', pos, size)
         self.anim_offset = (0, 0)
         self.exp = exp
-        angle = math.pi / 2 * random.random() + math.pi * 5/4
-        velocity = random.random() * 0.5 + 1
+        angle = math.pi / 2 * self.game.rng.spawn.random() + math.pi * 5/4
+        velocity = self.game.rng.spawn.random() * 0.5 + 1
         self.velocity = [math.cos(angle) * velocity, math.sin(angle) * velocity]
         self.hit_ground = False
 
-    def update(self, tilemap, movement=(0, 0)):
+    def pre_update(self, movement=(0, 0)):
         if self.collisions['down']:
             self.velocity[0] = 0
             self.hit_ground = True
@@ -330,7 +386,9 @@ class Experience(PhysicsEntity):
                 if self.game.player.pos[0] - self.pos[0] != 0 and self.game.player.pos[1] - self.pos[1] != 0:
                     self.velocity[0] = 16 / (self.game.player.pos[0] - self.pos[0]) if abs(self.game.player.pos[0] - self.pos[0]) > 8 else 2
                     self.velocity[1] = 1 / (self.game.player.pos[1] - self.pos[1]) if abs(self.game.player.pos[1] + 8 - self.pos[1]) > 4 else 0
-        super().update(tilemap, movement)
+
+    def post_update(self, movement=(0, 0)):
+        super().post_update(movement)
         if abs(self.game.player.pos[0] - self.pos[0]) < 16 and abs(self.game.player.pos[1] - self.pos[1]) < 16:
             if self.rect().colliderect(self.game.player.rect()):
                 self.game.player.exp += self.exp
@@ -0,0 +1,14 @@
+# where a player frame's mask sits relative to the enemy it is tested against, per facing, tuned by hand
+ATTACK_OFFSETS = ((-17, -16), (0, -16))
+# broadphase slack: the largest enemy sprite plus a tick of enemy movement, with room to spare
+TARGET_MARGIN = 32
+
+class Hitbox:
+    def __init__(self, mask, rect, offset):
+        self.mask = mask
+        self.rect = rect
+        self.offset = offset
+
+def build_hitboxes(animation):
+    # [flip][frame], sharing the animation's flipped masks and their bounding rects
+    return tuple([Hitbox(mask, rect, ATTACK_OFFSETS[flip]) for mask, rect in zip(animation.masks[flip], animation.rects[flip])] for flip in (0, 1))
@@ -0,0 +1,118 @@
+import numpy as np
+
+class TileDiff:
+    def __init__(self, x, y, mask, before, after):
+        # only the changed cells: a mask over their bounding box and the (types, variants) they had and have
+        self.x = x
+        self.y = y
+        self.mask = mask
+        self.before = before
+        self.after = after
+        self.cells = len(before[0])
+
+    def write(self, tilemap, values):
+        types = np.zeros(self.mask.shape, dtype=np.uint8)
+        variants = np.zeros(self.mask.shape, dtype=np.uint8)
+        types[self.mask] = values[0]
+        variants[self.mask] = values[1]
+        tilemap.write_tiles(self.x, self.y, types, variants, self.mask)
+
+    def undo(self, tilemap):
+        self.write(tilemap, self.before)
+
+    def redo(self, tilemap):
+        self.write(tilemap, self.after)
+
+class OffgridDiff:
+    def __init__(self, tile, added):
+        self.tile = tile
+        self.added = added
+        self.cells = 1
+
+    def undo(self, tilemap):
+        if self.added:
+            tilemap.remove_offgrid(self.tile)
+        else:
+            tilemap.add_offgrid(self.tile)
+
+    def redo(self, tilemap):
+        if self.added:
+            tilemap.add_offgrid(self.tile)
+        else:
+            tilemap.remove_offgrid(self.tile)
+
+class Change:
+    def __init__(self, journal, tilemap, bounds):
+        self.journal = journal
+        self.tilemap = tilemap
+        self.bounds = bounds
+
+    def __enter__(self):
+        self.before = self.tilemap.grid.read(self.bounds)
+        return self
+
+    def __exit__(self, *args):
+        before_types, before_variants = self.before
+        after_types, after_variants = self.tilemap.grid.read(self.bounds)
+        changed = (before_types != after_types) | (before_variants != after_variants)
+        ys, xs = np.nonzero(changed)
+        if not len(xs):
+            return
+        y0, y1, x0, x1 = int(ys.min()), int(ys.max()) + 1, int(xs.min()), int(xs.max()) + 1
+        mask = changed[y0:y1, x0:x1]
+        cells = (slice(y0, y1), slice(x0, x1))
+        before = (before_types[cells][mask], before_variants[cells][mask])
+        after = (after_types[cells][mask], after_variants[cells][mask])
+        self.journal.push(TileDiff(self.bounds[0] + x0, self.bounds[1] + y0, mask, before, after))
+
+class Journal:
+    def __init__(self, limit=256):
+        self.limit = limit
+        # operations are lists of diffs, a mouse drag or a paste undoes as one
+        self.done = []
+        self.undone = []
+        self.current = None
+        # cells changed since the last save, undo and redo count too
+        self.dirty = 0
+
+    def begin(self):
+        if self.current is None:
+            self.current = []
+
+    def end(self):
+        if self.current:
+            self.done.append(self.current)
+            del self.done[:-self.limit]
+            self.undone = []
+        self.current = None
+
+    def push(self, diff):
+        self.dirty += diff.cells
+        if self.current is not None:
+            self.current.append(diff)
+        else:
+            self.begin()
+            self.current.append(diff)
+            self.end()
+
+    def change(self, tilemap, bounds):
+        # records whatever happens to the grid inside bounds while the block runs
+        return Change(self, tilemap, bounds)
+
+    def undo(self, tilemap):
+        self.end()
+        if self.done:
+            operation = self.done.pop()
+            for diff in reversed(operation):
+                diff.undo(tilemap)
+                self.dirty += diff.cells
+            self.undone.append(operation)
+
+    def redo(self, tilemap):
+        self.end()
+        if self.undone:
+            operation = self.undone.pop()
+            for diff in operation:
+                diff.redo(tilemap)
+                self.dirty += diff.cells
+            self.done.append(operation)
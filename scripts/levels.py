@@ -0,0 +1,57 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from scripts.tilemap import Tilemap
+from scripts.mapfile import DELTA_EXT
+
+SPAWNERS = [('spawners', 0), ('spawners', 1)]
+TREES = [('large_decor', 2)]
+
+def modified(path):
+    # autosaved edits live next to the map until the next full save
+    if os.path.exists(path + DELTA_EXT):
+        return max(os.path.getmtime(path), os.path.getmtime(path + DELTA_EXT))
+    return os.path.getmtime(path)
+
+class Level:
+    def __init__(self, path):
+        # everything load_level used to do in the swap frame, on a tilemap no game is attached to
+        self.path = path
+        self.mtime = modified(path)
+        tilemap = Tilemap(None)
+        tilemap.load(path)
+        self.streamed = tilemap.streamer is not None
+        self.leaf_spawners = [pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13) for tree in tilemap.extract(TREES, keep=True)]
+        self.spawners = tilemap.extract(SPAWNERS)
+        self.grid = tilemap.grid
+        self.tile_size = tilemap.tile_size
+        self.offgrid_tiles = tilemap.offgrid_tiles
+        self.collision_cache = tilemap.collision_cache
+
+class LevelLoader:
+    def __init__(self, capacity=3):
+        # parsed levels by path, least recently used first
+        self.capacity = capacity
+        self.levels = OrderedDict()
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def preload(self, path):
+        if path not in self.levels and path not in self.pending:
+            self.pending[path] = self.executor.submit(Level, path)
+
+    def get(self, path):
+        if path in self.pending:
+            # blocks only if the swap frame comes before the background parse finished
+            self.levels[path] = self.pending.pop(path).result()
+        if path in self.levels and self.levels[path].mtime != modified(path):
+            del self.levels[path]
+        if path not in self.levels:
+            self.levels[path] = Level(path)
+        self.levels.move_to_end(path)
+        while len(self.levels) > self.capacity:
+            self.levels.popitem(last=False)
+        return self.levels[path]
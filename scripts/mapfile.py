@@ -0,0 +1,135 @@
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from scripts.tilegrid import TileGrid
+
+MAP_EXT = '.map'
+DELTA_EXT = '.delta'
+MAGIC = b'TGMP'
+VERSION = 1
+
+# magic, version, tile_size, origin x, origin y, width, height, type count, offgrid count
+HEADER = struct.Struct('<4sHHiiiiHI')
+OFFGRID_DTYPE = np.dtype([('type', '<u2'), ('variant', 'u1'), ('pad', 'u1'), ('x', '<f4'), ('y', '<f4')])
+ALIGN = 8
+
+def padding(offset):
+    return -offset % ALIGN
+
+def replace_file(path, data, mode='wb'):
+    # written next to the target and renamed over it, so readers see the old file or the new one, never half
+    tmp_path = path + '.tmp'
+    f = open(tmp_path, mode)
+    f.write(data)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_path, path)
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def append_delta(path, record):
+    # cell and off-grid changes on top of the map at path; the first line names the exact file they apply to,
+    # so a delta left over from before a full save is ignored rather than replayed twice
+    delta_path = path + DELTA_EXT
+    lines = []
+    if not os.path.exists(delta_path):
+        lines.append(json.dumps({'base' : file_signature(path)}))
+    lines.append(json.dumps(record))
+    f = open(delta_path, 'a')
+    f.write('\n'.join(lines) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+def read_delta(path):
+    delta_path = path + DELTA_EXT
+    if not os.path.exists(delta_path):
+        return []
+    f = open(delta_path, 'r')
+    lines = f.read().splitlines()
+    f.close()
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # torn by a crash mid-append, everything before it is intact
+            break
+    if not records or records[0].get('base') != file_signature(path):
+        return []
+    return records[1:]
+
+def write_map(path, grid, tile_size, offgrid_tiles):
+    type_names = grid.type_names[1:]
+    type_ids = dict(grid.type_ids)
+    for tile in offgrid_tiles:
+        if tile['type'] not in type_ids:
+            type_ids[tile['type']] = len(type_names) + 1
+            type_names.append(tile['type'])
+
+    width, height = grid.size()
+    chunks = [HEADER.pack(MAGIC, VERSION, tile_size, grid.origin[0], grid.origin[1], width, height, len(type_names), len(offgrid_tiles))]
+    for name in type_names:
+        name = name.encode('utf-8')
+        chunks.append(bytes([len(name)]) + name)
+
+    # planes and the offgrid table start on aligned offsets so they can be viewed in place
+    offset = sum(len(chunk) for chunk in chunks)
+    chunks.append(bytes(padding(offset)))
+    chunks.append(np.ascontiguousarray(grid.types).tobytes())
+    chunks.append(np.ascontiguousarray(grid.variants).tobytes())
+    offset = sum(len(chunk) for chunk in chunks)
+    chunks.append(bytes(padding(offset)))
+
+    offgrid = np.zeros(len(offgrid_tiles), dtype=OFFGRID_DTYPE)
+    for i, tile in enumerate(offgrid_tiles):
+        offgrid[i] = (type_ids[tile['type']], tile['variant'], 0, tile['pos'][0], tile['pos'][1])
+    chunks.append(offgrid.tobytes())
+
+    replace_file(path, b''.join(chunks))
+
+def read_map(path, solid_types=()):
+    f = open(path, 'rb')
+    # copy-on-write mapping: the planes below are writable views that never touch the file
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    f.close()
+
+    magic, version, tile_size, origin_x, origin_y, width, height, type_count, offgrid_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(path + ' is not a map file')
+    if version != VERSION:
+        raise ValueError(path + ' has unsupported map version ' + str(version))
+
+    offset = HEADER.size
+    type_names = []
+    for i in range(type_count):
+        length = data[offset]
+        type_names.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+    offset += padding(offset)
+
+    grid = TileGrid(solid_types)
+    for name in type_names:
+        grid.type_id(name)
+    grid.origin = (origin_x, origin_y)
+    grid.types = np.frombuffer(data, dtype=np.uint8, count=width * height, offset=offset).reshape(height, width)
+    offset += width * height
+    grid.variants = np.frombuffer(data, dtype=np.uint8, count=width * height, offset=offset).reshape(height, width)
+    offset += width * height
+    offset += padding(offset)
+    grid.count = int(np.count_nonzero(grid.types))
+    grid.update_solid()
+
+    offgrid = np.frombuffer(data, dtype=OFFGRID_DTYPE, count=offgrid_count, offset=offset)
+    offgrid_tiles = []
+    for type_id, variant, x, y in zip(offgrid['type'].tolist(), offgrid['variant'].tolist(), offgrid['x'].tolist(), offgrid['y'].tolist()):
+        offgrid_tiles.append({'type' : type_names[type_id - 1], 'variant' : variant, 'pos' : [x, y]})
+
+    return grid, tile_size, offgrid_tiles
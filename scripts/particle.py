@@ -1,24 +1,100 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
+import numpy as np
+
+# horizontal sway amplitude per particle type, driven by the animation frame
+SWAY = {'leaf' : 0.3}
+
+class Particles:
+    def __init__(self, game, capacity=256):
         self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+        self.type_ids = {}
+        self.images = []
+        # per type: first index into self.images, frame duration, frame count, loop flag, sway
+        self.type_base = np.zeros(0, dtype=np.int32)
+        self.type_dur = np.zeros(0, dtype=np.int32)
+        self.type_length = np.zeros(0, dtype=np.int32)
+        self.type_loop = np.zeros(0, dtype=bool)
+        self.type_sway = np.zeros(0)
+        self.image_half = np.zeros((0, 2), dtype=np.int32)
+
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.type = np.zeros(capacity, dtype=np.int32)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.size = 0
+
+    def __len__(self):
+        return len(self.alive) - len(self.free)
+
+    def register(self, p_type):
+        animation = self.game.assets['particle/' + p_type]
+        self.type_ids[p_type] = len(self.type_ids)
+        self.type_base = np.append(self.type_base, len(self.images))
+        self.type_dur = np.append(self.type_dur, animation.img_duration)
+        self.type_length = np.append(self.type_length, animation.img_duration * len(animation.images))
+        self.type_loop = np.append(self.type_loop, animation.loop)
+        self.type_sway = np.append(self.type_sway, SWAY.get(p_type, 0))
+        self.images += animation.images
+        self.image_half = np.concatenate((self.image_half, [(img.get_width() // 2, img.get_height() // 2) for img in animation.images]))
+
+    def grow(self):
+        capacity = len(self.alive)
+        self.pos = np.concatenate((self.pos, np.zeros((capacity, 2))))
+        self.velocity = np.concatenate((self.velocity, np.zeros((capacity, 2))))
+        self.frame = np.concatenate((self.frame, np.zeros(capacity, dtype=np.int32)))
+        self.type = np.concatenate((self.type, np.zeros(capacity, dtype=np.int32)))
+        self.done = np.concatenate((self.done, np.zeros(capacity, dtype=bool)))
+        self.alive = np.concatenate((self.alive, np.zeros(capacity, dtype=bool)))
+        self.free = list(range(capacity * 2 - 1, capacity - 1, -1)) + self.free
+
+    def add(self, p_type, pos, velocity=[0, 0], frame=0):
+        if p_type not in self.type_ids:
+            self.register(p_type)
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.size = max(self.size, slot + 1)
+        self.pos[slot] = pos
+        self.velocity[slot] = velocity
+        self.frame[slot] = frame
+        self.type[slot] = self.type_ids[p_type]
+        self.done[slot] = False
+        self.alive[slot] = True
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(len(self.alive) - 1, -1, -1))
+        self.size = 0
 
     def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        n = self.size
+        alive = self.alive[:n]
+        types = self.type[:n]
+        kill = alive & self.done[:n]
+
+        self.pos[:n] += self.velocity[:n]
+
+        length = self.type_length[types]
+        loop = self.type_loop[types]
+        frame = np.where(loop, (self.frame[:n] + 1) % length, np.minimum(self.frame[:n] + 1, length - 1))
+        self.frame[:n] = frame
+        self.done[:n] = ~loop & (frame >= length - 1)
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+        self.pos[:n, 0] += np.sin(frame * 0.035) * self.type_sway[types]
 
-        self.animation.update()
+        if kill.any():
+            alive[kill] = False
+            self.free += np.flatnonzero(kill).tolist()
+            while self.size and not self.alive[self.size - 1]:
+                self.size -= 1
 
-        return kill
-    
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
+        slots = np.flatnonzero(self.alive[:self.size])
+        if not len(slots):
+            return
+        types = self.type[slots]
+        image_ids = self.type_base[types] + self.frame[slots] // self.type_dur[types]
+        dest = self.pos[slots] - offset - self.image_half[image_ids]
+        surf.blits([(self.images[image_id], pos) for image_id, pos in zip(image_ids.tolist(), dest.tolist())], doreturn=False)
@@ -0,0 +1,110 @@
+import numpy as np
+
+class Archetype:
+    def __init__(self, friction=0, capacity=64):
+        self.friction = friction
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.entities = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.entities) - len(self.free)
+
+    def bind(self, entity):
+        # memoryviews over the entity's rows: entity code reads and writes the arrays directly
+        # but gets plain floats back, which keeps the per-entity code as fast as with lists
+        slot = entity.slot
+        entity.pos = memoryview(self.pos.reshape(-1))[slot * 2:slot * 2 + 2]
+        entity.velocity = memoryview(self.velocity.reshape(-1))[slot * 2:slot * 2 + 2]
+
+    def grow(self):
+        capacity = len(self.entities)
+        self.pos = np.concatenate((self.pos, np.zeros((capacity, 2))))
+        self.velocity = np.concatenate((self.velocity, np.zeros((capacity, 2))))
+        self.entities += [None] * capacity
+        self.free = list(range(capacity * 2 - 1, capacity - 1, -1)) + self.free
+        for entity in self.entities[:capacity]:
+            if entity is not None:
+                self.bind(entity)
+
+    def add(self, entity):
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.pos[slot] = entity.pos
+        self.velocity[slot] = entity.velocity
+        self.entities[slot] = entity
+        entity.slot = slot
+        self.bind(entity)
+
+    def remove(self, entity):
+        slot = entity.slot
+        entity.pos = self.pos[slot].tolist()
+        entity.velocity = self.velocity[slot].tolist()
+        entity.slot = None
+        self.entities[slot] = None
+        self.free.append(slot)
+
+    def clear(self):
+        for entity in self.entities:
+            if entity is not None:
+                self.remove(entity)
+
+    def step(self, tilemap, entities, movement=(0, 0)):
+        for entity in entities:
+            entity.pre_update(movement)
+
+        slots = np.fromiter((entity.slot for entity in entities), dtype=np.intp, count=len(entities))
+        frame_movement = self.velocity[slots] + movement
+
+        # integration is vectorised, only resolving against nearby tiles is per entity
+        self.pos[slots, 0] += frame_movement[:, 0]
+        for entity, dx, rects in zip(entities, frame_movement[:, 0].tolist(), tilemap.physics_rects_for(self.pos[slots])):
+            entity.resolve_x(tilemap, dx, rects)
+        self.pos[slots, 1] += frame_movement[:, 1]
+        for entity, dy, rects in zip(entities, frame_movement[:, 1].tolist(), tilemap.physics_rects_for(self.pos[slots])):
+            entity.resolve_y(tilemap, dy, rects)
+
+        vy = np.minimum(5, self.velocity[slots, 1] + 0.1)
+        vy[np.fromiter((entity.collisions['up'] or entity.collisions['down'] for entity in entities), dtype=bool, count=len(entities))] = 0
+        self.velocity[slots, 1] = vy
+
+        kills = [entity for entity in entities if entity.post_update(movement)]
+
+        if self.friction:
+            vx = self.velocity[slots, 0]
+            self.velocity[slots, 0] = np.sign(vx) * np.maximum(np.abs(vx) - self.friction, 0)
+        return kills
+
+class PhysicsWorld:
+    def __init__(self):
+        # one archetype per entity type, created on first add
+        self.archetypes = {}
+
+    def __len__(self):
+        return sum(len(archetype) for archetype in self.archetypes.values())
+
+    def add(self, entity):
+        if entity.type not in self.archetypes:
+            self.archetypes[entity.type] = Archetype(friction=entity.friction)
+        self.archetypes[entity.type].add(entity)
+
+    def remove(self, entity):
+        self.archetypes[entity.type].remove(entity)
+
+    def clear(self):
+        for archetype in self.archetypes.values():
+            archetype.clear()
+
+    def step(self, tilemap, entities, movement=(0, 0)):
+        # entities of each archetype move together, kills come back in the order they were given
+        groups = {}
+        for entity in entities:
+            groups.setdefault(entity.type, []).append(entity)
+        if len(groups) == 1:
+            return self.archetypes[entities[0].type].step(tilemap, entities, movement)
+        kills = set()
+        for e_type, group in groups.items():
+            kills.update(self.archetypes[e_type].step(tilemap, group, movement))
+        return [entity for entity in entities if entity in kills]
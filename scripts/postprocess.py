@@ -0,0 +1,108 @@
+import pygame
+
+MAX_REGIONS = 16
+
+def merge_rects(rects, bounds, margin=2):
+    merged = []
+    for rect in rects:
+        rect = rect.inflate(margin * 2, margin * 2).clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        # keep folding overlapping regions together until the new one is disjoint
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    if len(merged) > MAX_REGIONS:
+        merged = [merged[0].unionall(merged[1:])]
+    return merged
+
+class Stage:
+    # 'layer' stages draw before the sprite layer is composited, 'frame' stages after
+    phase = 'layer'
+
+    def __init__(self, name, enabled=True):
+        self.name = name
+        self.enabled = enabled
+
+    def apply(self, game, pipeline):
+        pass
+
+class OutlineStage(Stage):
+    def __init__(self, name='outline', enabled=False, color=(0, 0, 0, 180), offsets=((-1, 0), (1, 0), (0, -1), (0, 1))):
+        super().__init__(name, enabled)
+        self.color = color
+        self.offsets = offsets
+
+    def apply(self, game, pipeline):
+        for rect in merge_rects(pipeline.dirty, pipeline.layer.get_rect()):
+            mask = pygame.mask.from_surface(pipeline.layer.subsurface(rect))
+            silhouette = mask.to_surface(setcolor=self.color, unsetcolor=(0, 0, 0, 0))
+            for offset in self.offsets:
+                pipeline.target.blit(silhouette, (rect.x + offset[0], rect.y + offset[1]))
+
+class IrisStage(Stage):
+    def __init__(self, name='transition', enabled=True):
+        super().__init__(name, enabled)
+        self.surf = None
+        self.radius = None
+
+    def apply(self, game, pipeline):
+        if not game.transition:
+            return
+        radius = (30 - abs(game.transition)) * 8
+        if self.surf is None or self.surf.get_size() != pipeline.layer.get_size():
+            self.surf = pygame.Surface(pipeline.layer.get_size())
+            self.surf.set_colorkey((255, 255, 255))
+            self.radius = None
+        if radius != self.radius:
+            self.surf.fill((0, 0, 0))
+            pygame.draw.circle(self.surf, (255, 255, 255), (self.surf.get_width() // 2, self.surf.get_height() // 2), radius)
+            self.radius = radius
+        pipeline.layer.blit(self.surf, (0, 0))
+
+class ScreenshakeStage(Stage):
+    phase = 'frame'
+
+    def __init__(self, name='screenshake', enabled=True):
+        super().__init__(name, enabled)
+
+    def apply(self, game, pipeline):
+        rng = game.rng.screenshake
+        pipeline.offset = (rng.random() * game.screenshake - game.screenshake / 3, rng.random() * game.screenshake - game.screenshake / 3)
+
+class PostProcess:
+    def __init__(self):
+        self.stages = []
+        self.layer = None
+        self.target = None
+        self.dirty = []
+        # presentation offset in output pixels, set by frame stages
+        self.offset = (0, 0)
+
+    def register(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+
+    def toggle(self, name):
+        stage = self.stage(name)
+        stage.enabled = not stage.enabled
+
+    def apply(self, game, layer, target, dirty=()):
+        self.layer = layer
+        self.target = target
+        self.dirty = dirty
+        self.offset = (0, 0)
+        for stage in self.stages:
+            if stage.enabled and stage.phase == 'layer':
+                stage.apply(game, self)
+        target.blit(layer, (0, 0))
+        for stage in self.stages:
+            if stage.enabled and stage.phase == 'frame':
+                stage.apply(game, self)
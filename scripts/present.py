@@ -0,0 +1,51 @@
+import pygame
+from pygame._sdl2.video import Window, Renderer, Texture
+
+class ScalePresenter:
+    def __init__(self, window_size, source_size, integer_scale=False):
+        self.screen = pygame.display.set_mode(window_size)
+        self.integer_scale = integer_scale
+        screen_size = self.screen.get_size()
+        if integer_scale:
+            factor = max(1, min(screen_size[0] // source_size[0], screen_size[1] // source_size[1]))
+            self.size = (source_size[0] * factor, source_size[1] * factor)
+        else:
+            self.size = screen_size
+        self.pos = ((screen_size[0] - self.size[0]) // 2, (screen_size[1] - self.size[1]) // 2)
+        # scaled frames are written into these instead of a fresh surface every frame
+        self.frame = pygame.Surface(self.size).convert(self.screen)
+        self.target = self.screen.subsurface(pygame.Rect(self.pos, self.size))
+
+    def present(self, surf, offset=(0, 0)):
+        if self.integer_scale and not (offset[0] or offset[1]):
+            # no shake to apply, so scale straight into the window
+            pygame.transform.scale(surf, self.size, self.target)
+        else:
+            pygame.transform.scale(surf, self.size, self.frame)
+            if self.integer_scale:
+                self.screen.fill((0, 0, 0))
+            self.screen.blit(self.frame, (self.pos[0] + offset[0], self.pos[1] + offset[1]))
+        pygame.display.update()
+
+class RendererPresenter:
+    def __init__(self, window_size, source_size):
+        # the display module window only provides a pixel format for convert(); frames go to our own window
+        self.screen = pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        self.window = Window(pygame.display.get_caption()[0], size=(int(window_size[0]), int(window_size[1])))
+        self.renderer = Renderer(self.window)
+        self.texture = Texture(self.renderer, source_size, streaming=True)
+        self.size = self.window.size
+
+    def present(self, surf, offset=(0, 0)):
+        # the shake offset is in window pixels, which keeps it finer than one source pixel
+        self.texture.update(surf)
+        self.renderer.draw_color = (0, 0, 0, 255)
+        self.renderer.clear()
+        self.texture.draw(dstrect=pygame.Rect(round(offset[0]), round(offset[1]), self.size[0], self.size[1]))
+        self.renderer.present()
+
+PRESENTERS = {
+    'scale' : lambda window_size, source_size: ScalePresenter(window_size, source_size),
+    'integer' : lambda window_size, source_size: ScalePresenter(window_size, source_size, integer_scale=True),
+    'sdl2' : RendererPresenter,
+}
@@ -0,0 +1,107 @@
+import csv
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from scripts.utils import render_text
+
+HISTOGRAM_BINS = [0, 0.25, 0.5, 1, 2, 4, 8, 16.7, 33.3, float('inf')]
+
+class NullScope:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SCOPE = NullScope()
+
+class Scope:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, (time.perf_counter() - self.start) * 1000)
+
+class Profiler:
+    def __init__(self, enabled=False, history=240, max_frames=36000):
+        self.enabled = enabled
+        self.overlay = False
+        self.history = history
+        # rolling per-phase samples in milliseconds
+        self.samples = {}
+        self.frames = deque(maxlen=max_frames)
+        self.current = {}
+        self.scopes = {}
+        self.frame_start = 0
+
+    def scope(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        if name not in self.scopes:
+            self.scopes[name] = Scope(self, name)
+        return self.scopes[name]
+
+    def record(self, name, ms):
+        self.current[name] = self.current.get(name, 0) + ms
+
+    def begin_frame(self):
+        if self.enabled:
+            self.current = {}
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.current['frame'] = (time.perf_counter() - self.frame_start) * 1000
+        for name, ms in self.current.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.history)
+            self.samples[name].append(ms)
+        self.frames.append(self.current)
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled = True
+
+    def stats(self, name):
+        samples = np.array(self.samples[name])
+        return {'mean' : float(samples.mean()), 'p95' : float(np.percentile(samples, 95)), 'max' : float(samples.max())}
+
+    def histogram(self, name):
+        return np.histogram(np.array(self.samples[name]), bins=HISTOGRAM_BINS)[0].tolist()
+
+    def render(self, surf, pos=(2, 2)):
+        if not self.samples:
+            return
+        y = pos[1]
+        for name in sorted(self.samples, key=lambda name: name != 'frame'):
+            stats = self.stats(name)
+            surf.fill((150, 0, 0), (pos[0], y + 2, min(40, stats['mean'] * 2.4), 3))
+            surf.blit(render_text(f'{name} {stats["mean"]:.2f} {stats["max"]:.2f}', (255, 255, 255), 7), (pos[0] + 42, y))
+            y += 7
+
+    def export(self, path):
+        if path.endswith('.json'):
+            f = open(path, 'w')
+            json.dump({
+                'frames' : list(self.frames),
+                'phases' : {name : dict(self.stats(name), histogram=self.histogram(name)) for name in self.samples},
+                'histogram_bins' : HISTOGRAM_BINS[:-1],
+            }, f)
+            f.close()
+        else:
+            names = sorted({name for frame in self.frames for name in frame})
+            f = open(path, 'w', newline='')
+            writer = csv.DictWriter(f, fieldnames=names, restval=0)
+            writer.writeheader()
+            writer.writerows(self.frames)
+            f.close()
@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+
+from scripts.utils import DamageNumbers
+
+PROJECTILE_LIFETIME = 360
+PROJECTILE_DAMAGE = 4
+
+class Projectiles:
+    def __init__(self, game, capacity=64):
+        self.game = game
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.timer = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.size = 0
+
+    def __len__(self):
+        return len(self.alive) - len(self.free)
+
+    def grow(self):
+        capacity = len(self.alive)
+        self.pos = np.concatenate((self.pos, np.zeros((capacity, 2))))
+        self.velocity = np.concatenate((self.velocity, np.zeros((capacity, 2))))
+        self.timer = np.concatenate((self.timer, np.zeros(capacity, dtype=np.int32)))
+        self.alive = np.concatenate((self.alive, np.zeros(capacity, dtype=bool)))
+        self.free = list(range(capacity * 2 - 1, capacity - 1, -1)) + self.free
+
+    def add(self, pos, velocity):
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.size = max(self.size, slot + 1)
+        self.pos[slot] = pos
+        self.velocity[slot] = velocity
+        self.timer[slot] = 0
+        self.alive[slot] = True
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(len(self.alive) - 1, -1, -1))
+        self.size = 0
+
+    def kill(self, mask):
+        self.alive[:self.size][mask] = False
+        self.free += np.flatnonzero(mask).tolist()
+        while self.size and not self.alive[self.size - 1]:
+            self.size -= 1
+
+    def update(self):
+        n = self.size
+        if not n:
+            return
+        alive = self.alive[:n]
+        self.pos[:n] += self.velocity[:n]
+        self.timer[:n] += 1
+        pos = self.pos[:n]
+
+        # one lookup into the solid plane for every projectile at once
+        grid = self.game.tilemap.grid
+        tiles = np.floor(pos / self.game.tilemap.tile_size).astype(np.int64) - grid.origin
+        inside = alive & (tiles[:, 0] >= 0) & (tiles[:, 0] < grid.solid.shape[1]) & (tiles[:, 1] >= 0) & (tiles[:, 1] < grid.solid.shape[0])
+        walls = np.zeros(n, dtype=bool)
+        walls[inside] = grid.solid[tiles[inside, 1], tiles[inside, 0]]
+        expired = alive & ~walls & (self.timer[:n] > PROJECTILE_LIFETIME)
+
+        player = self.game.player
+        hits = np.zeros(n, dtype=bool)
+        if abs(player.dashing) < 50:
+            # Rect.collidepoint truncates, so this does too
+            rect = player.rect()
+            points = np.trunc(pos)
+            hits = alive & ~walls & ~expired & (points[:, 0] >= rect.left) & (points[:, 0] < rect.right) & (points[:, 1] >= rect.top) & (points[:, 1] < rect.bottom)
+
+        rng = self.game.rng.effects
+        for x, y, vx in zip(pos[walls, 0].tolist(), pos[walls, 1].tolist(), self.velocity[:n][walls, 0].tolist()):
+            for i in range(4):
+                self.game.sparks.add((x, y), rng.random() - 0.5 + (math.pi if vx > 0 else 0), 2 + rng.random())
+        for i in range(int(np.count_nonzero(hits))):
+            player.hp = max(0, player.hp - PROJECTILE_DAMAGE)
+            self.game.texts.append(DamageNumbers('-' + str(PROJECTILE_DAMAGE), player.pos, color=(150, 0, 0)))
+            self.game.play_sfx('hit')
+            self.game.screenshake = max(16, self.game.screenshake)
+
+        kill = walls | expired | hits
+        if kill.any():
+            self.kill(kill)
+
+    def render(self, surf, offset=(0, 0)):
+        slots = np.flatnonzero(self.alive[:self.size])
+        if not len(slots):
+            return
+        img = self.game.assets['projectile']
+        dest = self.pos[slots] - offset - (img.get_width() / 2, img.get_height() / 2)
+        surf.blits([(img, pos) for pos in dest.tolist()], doreturn=False)
@@ -0,0 +1,64 @@
+import struct
+import zlib
+
+RECORDING_EXT = '.rec'
+MAGIC = b'TGRC'
+VERSION = 1
+
+# magic, version, flags, seed, level, ticks
+HEADER = struct.Struct('<4sHHQHI')
+FLAG_BATCHED_PHYSICS = 1
+
+ACTIONS = ('jump', 'dash', 'attack', 'run', 'walk')
+ACTION_CODES = {action : i for i, action in enumerate(ACTIONS)}
+
+class Recording:
+    def __init__(self, seed, level=0, batched_physics=False, ticks=None):
+        self.seed = seed
+        self.level = level
+        self.batched_physics = batched_physics
+        # per tick: (left, right), actions in the order they were applied
+        self.ticks = ticks if ticks is not None else []
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def record(self, movement, actions=()):
+        self.ticks.append(((bool(movement[0]), bool(movement[1])), tuple(actions)))
+
+    def inputs(self):
+        return iter(self.ticks)
+
+    def save(self, path):
+        # a tick is one byte (movement bits and action count) followed by one byte per action
+        data = bytearray()
+        for movement, actions in self.ticks:
+            data.append(movement[0] | movement[1] << 1 | len(actions) << 2)
+            data.extend(ACTION_CODES[action] for action in actions)
+        flags = FLAG_BATCHED_PHYSICS if self.batched_physics else 0
+        f = open(path, 'wb')
+        f.write(HEADER.pack(MAGIC, VERSION, flags, self.seed, self.level, len(self.ticks)))
+        f.write(zlib.compress(bytes(data), 9))
+        f.close()
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'rb')
+        raw = f.read()
+        f.close()
+
+        magic, version, flags, seed, level, tick_count = HEADER.unpack_from(raw, 0)
+        if magic != MAGIC:
+            raise ValueError(path + ' is not a recording')
+        if version != VERSION:
+            raise ValueError('unsupported recording version ' + str(version))
+        data = zlib.decompress(raw[HEADER.size:])
+
+        ticks = []
+        i = 0
+        for tick in range(tick_count):
+            byte = data[i]
+            count = byte >> 2
+            ticks.append(((bool(byte & 1), bool(byte & 2)), tuple(ACTIONS[code] for code in data[i + 1:i + 1 + count])))
+            i += 1 + count
+        return cls(seed, level, bool(flags & FLAG_BATCHED_PHYSICS), ticks)
@@ -0,0 +1,230 @@
+import os
+import json
+import math
+import queue
+import threading
+
+import numpy as np
+
+from scripts.tilegrid import TileGrid
+from scripts.mapfile import MAP_EXT, read_map, write_map
+
+REGION_EXT = '.regions'
+REGION_SIZE = 32
+# matches scripts.tilemap, which imports this module
+CHUNK_SIZE = 8
+# always resident and kept out of the region files: level markers read once at load time
+RESIDENT_TILES = {('spawners', 0), ('spawners', 1), ('large_decor', 2)}
+# rough cost of a resident region beyond its tile planes: baked chunk surfaces and decor
+CHUNK_BYTES = 128 * 128 * 4
+OFFGRID_BYTES = 200
+
+def region_file(path, region):
+    return os.path.join(path, 'r.' + str(region[0]) + '.' + str(region[1]) + MAP_EXT)
+
+def write_regions(path, grid, tile_size, offgrid_tiles, region_size=REGION_SIZE):
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(MAP_EXT):
+            os.remove(os.path.join(path, name))
+
+    resident = []
+    region_offgrid = {}
+    for tile in offgrid_tiles:
+        if (tile['type'], tile['variant']) in RESIDENT_TILES:
+            resident.append(tile)
+        else:
+            region = (math.floor(tile['pos'][0] / tile_size) // region_size, math.floor(tile['pos'][1] / tile_size) // region_size)
+            region_offgrid.setdefault(region, []).append(tile)
+
+    grid = grid.copy()
+    for tile_type, variant in RESIDENT_TILES:
+        for x, y in grid.find(tile_type, variant):
+            resident.append({'type' : tile_type, 'variant' : variant, 'pos' : [x * tile_size, y * tile_size]})
+            grid.remove(x, y)
+
+    regions = set(region_offgrid)
+    x0, y0, x1, y1 = grid.bounds()
+    for ry in range(math.floor(y0 / region_size), math.ceil(y1 / region_size)):
+        for rx in range(math.floor(x0 / region_size), math.ceil(x1 / region_size)):
+            if any(True for tile in grid.cells_in(rx * region_size, ry * region_size, (rx + 1) * region_size, (ry + 1) * region_size)):
+                regions.add((rx, ry))
+
+    for region in sorted(regions):
+        region_grid = TileGrid(grid.solid_types)
+        region_grid.type_names = grid.type_names.copy()
+        region_grid.type_ids = grid.type_ids.copy()
+        bounds = (max(x0, region[0] * region_size), max(y0, region[1] * region_size), min(x1, (region[0] + 1) * region_size), min(y1, (region[1] + 1) * region_size))
+        if bounds[0] < bounds[2] and bounds[1] < bounds[3]:
+            region_grid.origin = (bounds[0], bounds[1])
+            region_grid.types = grid.types[bounds[1] - y0:bounds[3] - y0, bounds[0] - x0:bounds[2] - x0].copy()
+            region_grid.variants = grid.variants[bounds[1] - y0:bounds[3] - y0, bounds[0] - x0:bounds[2] - x0].copy()
+        write_map(region_file(path, region), region_grid, tile_size, region_offgrid.get(region, []))
+
+    f = open(os.path.join(path, 'world.json'), 'w')
+    json.dump({'tile_size' : tile_size, 'region_size' : region_size, 'regions' : sorted(regions), 'resident' : resident}, f)
+    f.close()
+
+class Region:
+    def __init__(self, bounds, offgrid_tiles, size):
+        # tile bounds x0, y0, x1, y1
+        self.bounds = bounds
+        self.offgrid_tiles = offgrid_tiles
+        self.size = size
+        self.last_used = 0
+
+class RegionStreamer:
+    def __init__(self, tilemap, path, radius=1, lookahead=45, budget=32 * 1024 * 1024):
+        self.tilemap = tilemap
+        self.path = path
+        # regions kept around the view, and how many ticks of travel to prefetch ahead of it
+        self.radius = radius
+        self.lookahead = lookahead
+        self.budget = budget
+
+        f = open(os.path.join(path, 'world.json'), 'r')
+        world = json.load(f)
+        f.close()
+        self.tile_size = world['tile_size']
+        self.region_size = world['region_size']
+        self.available = {tuple(region) for region in world['regions']}
+        self.resident = world['resident']
+
+        self.loaded = {}
+        self.pending = set()
+        self.tick = 0
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+
+    def region_px(self):
+        return self.tile_size * self.region_size
+
+    def regions_in(self, rect):
+        region_px = self.region_px()
+        regions = set()
+        for rx in range(rect.left // region_px, (rect.right - 1) // region_px + 1):
+            for ry in range(rect.top // region_px, (rect.bottom - 1) // region_px + 1):
+                if (rx, ry) in self.available:
+                    regions.add((rx, ry))
+        return regions
+
+    def memory(self):
+        return sum(region.size for region in self.loaded.values())
+
+    def read(self, region):
+        grid, tile_size, offgrid_tiles = read_map(region_file(self.path, region), self.tilemap.grid.solid_types)
+        return grid, offgrid_tiles
+
+    def work(self):
+        # only reads and decodes files; the tilemap itself is only touched on the main thread
+        while True:
+            region = self.requests.get()
+            if region is None:
+                return
+            try:
+                self.results.put((region, self.read(region)))
+            except Exception as e:
+                self.results.put((region, e))
+
+    def request(self, region):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.work, daemon=True)
+            self.worker.start()
+        self.pending.add(region)
+        self.requests.put(region)
+
+    def stop(self):
+        if self.worker is not None:
+            self.requests.put(None)
+            self.worker = None
+
+    def fit(self):
+        # the grid only ever spans the resident regions
+        grid = self.tilemap.grid
+        if not self.loaded:
+            grid.resize((0, 0, 0, 0))
+            return
+        bounds = [region.bounds for region in self.loaded.values()]
+        grid.resize((min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds)))
+
+    def apply(self, region, data):
+        region_grid, offgrid_tiles = data
+        tilemap = self.tilemap
+        grid = tilemap.grid
+        bounds = (region[0] * self.region_size, region[1] * self.region_size, (region[0] + 1) * self.region_size, (region[1] + 1) * self.region_size)
+        chunks = (self.region_size // CHUNK_SIZE) ** 2
+        self.loaded[region] = Region(bounds, offgrid_tiles, self.region_size ** 2 * 3 + len(offgrid_tiles) * OFFGRID_BYTES + chunks * CHUNK_BYTES)
+        self.fit()
+
+        if region_grid.types.size:
+            # region files carry their own type ids
+            lut = np.array([0] + [grid.type_id(name) for name in region_grid.type_names[1:]], dtype=np.uint8)
+            x = region_grid.origin[0] - grid.origin[0]
+            y = region_grid.origin[1] - grid.origin[1]
+            h, w = region_grid.types.shape
+            grid.types[y:y + h, x:x + w] = lut[region_grid.types]
+            grid.variants[y:y + h, x:x + w] = region_grid.variants
+            grid.solid[y:y + h, x:x + w] = np.isin(grid.types[y:y + h, x:x + w], grid.solid_ids())
+            grid.count += int(np.count_nonzero(region_grid.types))
+
+        tilemap.offgrid_tiles += offgrid_tiles
+        for tile in offgrid_tiles:
+            tilemap.invalidate_offgrid(tile)
+        tilemap.invalidate_tiles(bounds)
+
+    def evict(self, region):
+        tilemap = self.tilemap
+        grid = tilemap.grid
+        loaded = self.loaded.pop(region)
+        x0, y0 = loaded.bounds[0] - grid.origin[0], loaded.bounds[1] - grid.origin[1]
+        x1, y1 = loaded.bounds[2] - grid.origin[0], loaded.bounds[3] - grid.origin[1]
+        grid.types[y0:y1, x0:x1] = 0
+        grid.variants[y0:y1, x0:x1] = 0
+        grid.solid[y0:y1, x0:x1] = False
+        self.fit()
+
+        for tile in loaded.offgrid_tiles:
+            tilemap.offgrid_tiles.remove(tile)
+            tilemap.invalidate_offgrid(tile)
+        tilemap.invalidate_tiles(loaded.bounds)
+
+    def load_all(self):
+        for region in sorted(self.available - set(self.loaded)):
+            self.apply(region, self.read(region))
+
+    def update(self, rect, velocity=(0, 0)):
+        self.tick += 1
+        while True:
+            try:
+                region, data = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(region)
+            if isinstance(data, Exception):
+                raise data
+            if region not in self.loaded:
+                self.apply(region, data)
+
+        # whatever the view touches has to be resident before physics or render run
+        needed = self.regions_in(rect)
+        for region in sorted(needed - set(self.loaded)):
+            self.apply(region, self.read(region))
+
+        margin = self.radius * self.region_px()
+        ahead = rect.move(velocity[0] * self.lookahead, velocity[1] * self.lookahead)
+        wanted = self.regions_in(rect.union(ahead).inflate(margin * 2, margin * 2))
+        center = (rect.centerx + velocity[0] * self.lookahead / 2, rect.centery + velocity[1] * self.lookahead / 2)
+        region_px = self.region_px()
+        for region in sorted(wanted - set(self.loaded) - self.pending, key=lambda r: abs((r[0] + 0.5) * region_px - center[0]) + abs((r[1] + 0.5) * region_px - center[1])):
+            self.request(region)
+
+        for region in wanted | needed:
+            if region in self.loaded:
+                self.loaded[region].last_used = self.tick
+
+        if self.memory() > self.budget:
+            for region in sorted(set(self.loaded) - wanted - needed, key=lambda r: self.loaded[r].last_used):
+                self.evict(region)
+                if self.memory() <= self.budget:
+                    break
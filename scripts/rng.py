@@ -0,0 +1,14 @@
+import random
+
+# one generator per subsystem, so cosmetic draws never shift gameplay ones
+STREAMS = ('ai', 'spawn', 'effects', 'leaves', 'clouds', 'screenshake')
+
+class RandomStreams:
+    def __init__(self, seed=None):
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        for name in STREAMS:
+            # str seeds hash with sha512, so streams are stable across runs and platforms
+            setattr(self, name, random.Random(f'{self.seed}:{name}'))
@@ -1,27 +1,69 @@
 import math
 
+import numpy as np
 import pygame
 
-class Spark:
-    def __init__(self, pos, angle, speed, color=(255, 255, 255)):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
-        self.color = color
+# polygon corners as (angle offset, length multiplier on speed)
+SPARK_SHAPE = np.array([(0, 3), (math.pi * 0.5, 0.5), (math.pi, 3), (-math.pi * 0.5, 0.5)])
+
+class Sparks:
+    def __init__(self, capacity=128):
+        self.pos = np.zeros((capacity, 2))
+        self.angle = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.size = 0
+
+    def __len__(self):
+        return len(self.alive) - len(self.free)
+
+    def grow(self):
+        capacity = len(self.alive)
+        self.pos = np.concatenate((self.pos, np.zeros((capacity, 2))))
+        self.angle = np.concatenate((self.angle, np.zeros(capacity)))
+        self.speed = np.concatenate((self.speed, np.zeros(capacity)))
+        self.color = np.concatenate((self.color, np.zeros((capacity, 3), dtype=np.uint8)))
+        self.alive = np.concatenate((self.alive, np.zeros(capacity, dtype=bool)))
+        self.free = list(range(capacity * 2 - 1, capacity - 1, -1)) + self.free
+
+    def add(self, pos, angle, speed, color=(255, 255, 255)):
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.size = max(self.size, slot + 1)
+        self.pos[slot] = pos
+        self.angle[slot] = angle
+        self.speed[slot] = speed
+        self.color[slot] = color
+        self.alive[slot] = True
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(len(self.alive) - 1, -1, -1))
+        self.size = 0
 
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+        n = self.size
+        self.pos[:n, 0] += np.cos(self.angle[:n]) * self.speed[:n]
+        self.pos[:n, 1] += np.sin(self.angle[:n]) * self.speed[:n]
+        self.speed[:n] = np.maximum(0, self.speed[:n] - 0.1)
+
+        kill = self.alive[:n] & (self.speed[:n] == 0)
+        if kill.any():
+            self.alive[:n][kill] = False
+            self.free += np.flatnonzero(kill).tolist()
+            while self.size and not self.alive[self.size - 1]:
+                self.size -= 1
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
-    
     def render(self, surf, offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1])
-        ]
-
-        pygame.draw.polygon(surf, self.color, render_points)
+        slots = np.flatnonzero(self.alive[:self.size])
+        if not len(slots):
+            return []
+        angles = self.angle[slots, None] + SPARK_SHAPE[:, 0]
+        lengths = self.speed[slots, None] * SPARK_SHAPE[:, 1]
+        points = np.empty((len(slots), len(SPARK_SHAPE), 2))
+        points[:, :, 0] = self.pos[slots, 0, None] + np.cos(angles) * lengths - offset[0]
+        points[:, :, 1] = self.pos[slots, 1, None] + np.sin(angles) * lengths - offset[1]
+        return [pygame.draw.polygon(surf, color, polygon) for color, polygon in zip(self.color[slots].tolist(), points.tolist())]
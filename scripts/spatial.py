@@ -0,0 +1,63 @@
+class SpatialHash:
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        # cell -> {entity: None}, dicts keep insertion order so queries are deterministic
+        self.cells = {}
+        self.entity_cells = {}
+
+    def __len__(self):
+        return len(self.entity_cells)
+
+    def __contains__(self, entity):
+        return entity in self.entity_cells
+
+    def __iter__(self):
+        return iter(list(self.entity_cells))
+
+    def cell(self, pos):
+        return (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+
+    def insert(self, entity):
+        cell = self.cell(entity.pos)
+        self.cells.setdefault(cell, {})[entity] = None
+        self.entity_cells[entity] = cell
+        entity.spatial = self
+
+    def remove(self, entity):
+        cell = self.entity_cells.pop(entity)
+        del self.cells[cell][entity]
+        if not self.cells[cell]:
+            del self.cells[cell]
+        entity.spatial = None
+
+    def move(self, entity):
+        cell = self.cell(entity.pos)
+        old_cell = self.entity_cells[entity]
+        if cell != old_cell:
+            del self.cells[old_cell][entity]
+            if not self.cells[old_cell]:
+                del self.cells[old_cell]
+            self.cells.setdefault(cell, {})[entity] = None
+            self.entity_cells[entity] = cell
+
+    def clear(self):
+        for entity in self.entity_cells:
+            entity.spatial = None
+        self.cells = {}
+        self.entity_cells = {}
+
+    def query(self, x0, y0, x1, y1):
+        # entities whose position lies inside the inclusive region
+        found = []
+        c0 = self.cell((x0, y0))
+        c1 = self.cell((x1, y1))
+        for cx in range(c0[0], c1[0] + 1):
+            for cy in range(c0[1], c1[1] + 1):
+                if (cx, cy) in self.cells:
+                    for entity in self.cells[(cx, cy)]:
+                        if x0 <= entity.pos[0] <= x1 and y0 <= entity.pos[1] <= y1:
+                            found.append(entity)
+        return found
+
+    def query_rect(self, rect, margin=0):
+        return self.query(rect.left - margin, rect.top - margin, rect.right + margin, rect.bottom + margin)
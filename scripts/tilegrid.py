@@ -0,0 +1,221 @@
+import numpy as np
+
+GROW_MARGIN = 16
+
+class TileGrid:
+    def __init__(self, solid_types=()):
+        self.solid_types = set(solid_types)
+        # type id 0 is reserved for empty cells
+        self.type_names = [None]
+        self.type_ids = {}
+        self.origin = (0, 0)
+        self.types = np.zeros((0, 0), dtype=np.uint8)
+        self.variants = np.zeros((0, 0), dtype=np.uint8)
+        self.solid = np.zeros((0, 0), dtype=bool)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, pos):
+        return self.type_at(pos[0], pos[1]) != 0
+
+    def __iter__(self):
+        ys, xs = np.nonzero(self.types)
+        types = self.types[ys, xs].tolist()
+        variants = self.variants[ys, xs].tolist()
+        xs = (xs + self.origin[0]).tolist()
+        ys = (ys + self.origin[1]).tolist()
+        for i in range(len(types)):
+            yield xs[i], ys[i], self.type_names[types[i]], variants[i]
+
+    def size(self):
+        return (self.types.shape[1], self.types.shape[0])
+
+    def bounds(self):
+        return (self.origin[0], self.origin[1], self.origin[0] + self.types.shape[1], self.origin[1] + self.types.shape[0])
+
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            self.type_ids[tile_type] = len(self.type_names)
+            self.type_names.append(tile_type)
+        return self.type_ids[tile_type]
+
+    def solid_ids(self):
+        return [self.type_ids[tile_type] for tile_type in self.solid_types if tile_type in self.type_ids]
+
+    def type_at(self, x, y):
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.types.shape[1] and 0 <= y < self.types.shape[0]:
+            return self.types.item(y, x)
+        return 0
+
+    def get(self, x, y):
+        type_id = self.type_at(x, y)
+        if type_id:
+            return self.type_names[type_id], self.variants.item(y - self.origin[1], x - self.origin[0])
+
+    def is_solid(self, x, y):
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.solid.shape[1] and 0 <= y < self.solid.shape[0]:
+            return self.solid.item(y, x)
+        return False
+
+    def resize(self, bounds):
+        width = bounds[2] - bounds[0]
+        height = bounds[3] - bounds[1]
+        # only the overlap of the old and new bounds is kept, so this can shrink the grid too
+        x0 = max(bounds[0], self.origin[0])
+        y0 = max(bounds[1], self.origin[1])
+        x1 = min(bounds[2], self.origin[0] + self.types.shape[1])
+        y1 = min(bounds[3], self.origin[1] + self.types.shape[0])
+        planes = []
+        for plane in (self.types, self.variants, self.solid):
+            new_plane = np.zeros((height, width), dtype=plane.dtype)
+            if x0 < x1 and y0 < y1:
+                new_plane[y0 - bounds[1]:y1 - bounds[1], x0 - bounds[0]:x1 - bounds[0]] = plane[y0 - self.origin[1]:y1 - self.origin[1], x0 - self.origin[0]:x1 - self.origin[0]]
+            planes.append(new_plane)
+        self.types, self.variants, self.solid = planes
+        self.origin = (bounds[0], bounds[1])
+        self.count = int(np.count_nonzero(self.types))
+
+    def ensure(self, x, y):
+        bounds = self.bounds()
+        if not self.types.size:
+            self.resize((x, y, x + 1, y + 1))
+        elif not (bounds[0] <= x < bounds[2] and bounds[1] <= y < bounds[3]):
+            self.resize((min(bounds[0], x - GROW_MARGIN), min(bounds[1], y - GROW_MARGIN), max(bounds[2], x + GROW_MARGIN + 1), max(bounds[3], y + GROW_MARGIN + 1)))
+
+    def set(self, x, y, tile_type, variant):
+        self.ensure(x, y)
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if not self.types[y, x]:
+            self.count += 1
+        self.types[y, x] = self.type_id(tile_type)
+        self.variants[y, x] = variant
+        self.solid[y, x] = tile_type in self.solid_types
+
+    def set_variant(self, x, y, variant):
+        self.variants[y - self.origin[1], x - self.origin[0]] = variant
+
+    def remove(self, x, y):
+        if not self.type_at(x, y):
+            return False
+        x -= self.origin[0]
+        y -= self.origin[1]
+        self.types[y, x] = 0
+        self.variants[y, x] = 0
+        self.solid[y, x] = False
+        self.count -= 1
+        return True
+
+    def read(self, bounds):
+        # copies of the type and variant planes over bounds, empty outside the grid
+        types = np.zeros((bounds[3] - bounds[1], bounds[2] - bounds[0]), dtype=np.uint8)
+        variants = np.zeros_like(types)
+        x0 = max(bounds[0], self.origin[0])
+        y0 = max(bounds[1], self.origin[1])
+        x1 = min(bounds[2], self.origin[0] + self.types.shape[1])
+        y1 = min(bounds[3], self.origin[1] + self.types.shape[0])
+        if x0 < x1 and y0 < y1:
+            types[y0 - bounds[1]:y1 - bounds[1], x0 - bounds[0]:x1 - bounds[0]] = self.types[y0 - self.origin[1]:y1 - self.origin[1], x0 - self.origin[0]:x1 - self.origin[0]]
+            variants[y0 - bounds[1]:y1 - bounds[1], x0 - bounds[0]:x1 - bounds[0]] = self.variants[y0 - self.origin[1]:y1 - self.origin[1], x0 - self.origin[0]:x1 - self.origin[0]]
+        return types, variants
+
+    def write(self, x, y, types, variants, mask):
+        # types are ids of this grid, only cells under mask are written
+        ys, xs = np.nonzero(mask & (types != 0))
+        if len(xs):
+            needed = (x + int(xs.min()), y + int(ys.min()), x + int(xs.max()) + 1, y + int(ys.max()) + 1)
+            bounds = self.bounds()
+            if not self.types.size:
+                self.resize(needed)
+            elif not (bounds[0] <= needed[0] and bounds[1] <= needed[1] and needed[2] <= bounds[2] and needed[3] <= bounds[3]):
+                self.resize((min(bounds[0], needed[0] - GROW_MARGIN), min(bounds[1], needed[1] - GROW_MARGIN), max(bounds[2], needed[2] + GROW_MARGIN), max(bounds[3], needed[3] + GROW_MARGIN)))
+
+        # erasing outside the grid is a no-op, so the write is clipped to it
+        x0 = max(x, self.origin[0])
+        y0 = max(y, self.origin[1])
+        x1 = min(x + types.shape[1], self.origin[0] + self.types.shape[1])
+        y1 = min(y + types.shape[0], self.origin[1] + self.types.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        cells = (slice(y0 - self.origin[1], y1 - self.origin[1]), slice(x0 - self.origin[0], x1 - self.origin[0]))
+        patch = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        mask = mask[patch]
+        self.count += int(np.count_nonzero(types[patch][mask])) - int(np.count_nonzero(self.types[cells][mask]))
+        self.types[cells][mask] = types[patch][mask]
+        self.variants[cells][mask] = variants[patch][mask]
+        self.solid[cells] = np.isin(self.types[cells], self.solid_ids())
+
+    def cells_in(self, x0, y0, x1, y1):
+        bx0 = max(x0 - self.origin[0], 0)
+        by0 = max(y0 - self.origin[1], 0)
+        bx1 = min(x1 - self.origin[0], self.types.shape[1])
+        by1 = min(y1 - self.origin[1], self.types.shape[0])
+        if bx0 >= bx1 or by0 >= by1:
+            return
+        ys, xs = np.nonzero(self.types[by0:by1, bx0:bx1])
+        types = self.types[by0:by1, bx0:bx1][ys, xs].tolist()
+        variants = self.variants[by0:by1, bx0:bx1][ys, xs].tolist()
+        xs = (xs + bx0 + self.origin[0]).tolist()
+        ys = (ys + by0 + self.origin[1]).tolist()
+        for i in range(len(types)):
+            yield xs[i], ys[i], self.type_names[types[i]], variants[i]
+
+    def find(self, tile_type, variant):
+        if tile_type not in self.type_ids:
+            return []
+        ys, xs = np.nonzero((self.types == self.type_ids[tile_type]) & (self.variants == variant))
+        return list(zip((xs + self.origin[0]).tolist(), (ys + self.origin[1]).tolist()))
+
+    def solid_spans(self):
+        # greedy merge: horizontal runs per row, extended downwards while the run below matches exactly
+        rects = []
+        open_spans = {}
+        for y in range(self.solid.shape[0]):
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], self.solid[y].view(np.int8), [0]))))
+            next_spans = {}
+            for x0, x1 in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                if (x0, x1) in open_spans:
+                    rect = open_spans[(x0, x1)]
+                    rect[3] += 1
+                else:
+                    rect = [x0 + self.origin[0], y + self.origin[1], x1 - x0, 1]
+                    rects.append(rect)
+                next_spans[(x0, x1)] = rect
+            open_spans = next_spans
+        return [tuple(rect) for rect in rects]
+
+    def update_solid(self):
+        self.solid = np.isin(self.types, self.solid_ids())
+
+    def copy(self):
+        grid = TileGrid(self.solid_types)
+        grid.type_names = self.type_names.copy()
+        grid.type_ids = self.type_ids.copy()
+        grid.origin = self.origin
+        grid.types = self.types.copy()
+        grid.variants = self.variants.copy()
+        grid.solid = self.solid.copy()
+        grid.count = self.count
+        return grid
+
+    @classmethod
+    def from_tiles(cls, tiles, solid_types=()):
+        grid = cls(solid_types)
+        tiles = list(tiles)
+        if not tiles:
+            return grid
+        xs = [tile[0] for tile in tiles]
+        ys = [tile[1] for tile in tiles]
+        grid.resize((min(xs), min(ys), max(xs) + 1, max(ys) + 1))
+        for x, y, tile_type, variant in tiles:
+            grid.types[y - grid.origin[1], x - grid.origin[0]] = grid.type_id(tile_type)
+            grid.variants[y - grid.origin[1], x - grid.origin[0]] = variant
+        grid.count = int(np.count_nonzero(grid.types))
+        grid.update_solid()
+        return grid
@@ -1,6 +1,14 @@
+import os
 import json
+import math
+
+import numpy as np
 import pygame
 
+from scripts.tilegrid import TileGrid
+from scripts.mapfile import MAP_EXT, DELTA_EXT, read_map, write_map, replace_file, read_delta
+from scripts.regions import REGION_EXT, RegionStreamer
+
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])) : 0,
     tuple(sorted([(1, 0), (0, 1), (-1, 0)])) : 1,
@@ -13,16 +21,138 @@ AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])) : 8
 }
 
+# neighbour masks as bitfields: right, left, up, down
+AUTOTILE_BITS = {(1, 0) : 1, (-1, 0) : 2, (0, -1) : 4, (0, 1) : 8}
+# variant for every mask, -1 where the map has no entry and the variant is left alone
+AUTOTILE_VARIANTS = np.full(16, -1, dtype=np.int16)
+for neighbours, variant in AUTOTILE_MAP.items():
+    AUTOTILE_VARIANTS[sum(AUTOTILE_BITS[shift] for shift in neighbours)] = variant
+
 NEIGHBOUR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone'}
 AUTOTILE_TYPES = {'grass', 'stone'}
+CHUNK_SIZE = 8
+
+def save_map(path, grid, tile_size, offgrid_tiles):
+    if path.endswith(MAP_EXT):
+        write_map(path, grid, tile_size, offgrid_tiles)
+    else:
+        # the position is already in the key
+        tilemap = {}
+        for x, y, tile_type, variant in grid:
+            tilemap[str(x) + ';' + str(y)] = {'type' : tile_type, 'variant' : variant}
+        replace_file(path, json.dumps({'tilemap' : tilemap, 'tile_size' : tile_size, 'offgrid' : offgrid_tiles}), 'w')
+    # a full save supersedes the delta journal
+    if os.path.exists(path + DELTA_EXT):
+        os.remove(path + DELTA_EXT)
 
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}
+        self.grid = TileGrid(PHYSICS_TILES)
         self.offgrid_tiles = []
+        # baked chunk surfaces keyed by chunk coordinates, None for empty chunks
+        self.chunks = {}
+        self.offgrid_index = None
+        # merged solid rects reachable from each cell's 3x3 neighbourhood
+        self.collision_cache = None
+        # set for region-streamed maps, which only keep the regions around the view in the grid
+        self.streamer = None
+
+    def chunk_px(self):
+        return self.tile_size * CHUNK_SIZE
+
+    def invalidate(self, tile_pos=None):
+        if tile_pos is None:
+            self.chunks = {}
+            self.offgrid_index = None
+        else:
+            self.chunks.pop((tile_pos[0] // CHUNK_SIZE, tile_pos[1] // CHUNK_SIZE), None)
+
+    def invalidate_tiles(self, bounds):
+        for cx in range(bounds[0] // CHUNK_SIZE, (bounds[2] - 1) // CHUNK_SIZE + 1):
+            for cy in range(bounds[1] // CHUNK_SIZE, (bounds[3] - 1) // CHUNK_SIZE + 1):
+                self.chunks.pop((cx, cy), None)
+        self.collision_cache = None
+
+    def offgrid_rect(self, tile):
+        size = (self.tile_size, self.tile_size)
+        if self.game is not None and tile['type'] in self.game.assets:
+            size = self.game.assets[tile['type']][tile['variant']].get_size()
+        # padded by a pixel so fractional positions never miss a chunk they bleed into
+        return pygame.Rect(math.floor(tile['pos'][0]), math.floor(tile['pos'][1]), size[0] + 1, size[1] + 1)
+
+    def chunks_in_rect(self, rect):
+        chunk_px = self.chunk_px()
+        for cx in range(rect.left // chunk_px, (rect.right - 1) // chunk_px + 1):
+            for cy in range(rect.top // chunk_px, (rect.bottom - 1) // chunk_px + 1):
+                yield (cx, cy)
+
+    def invalidate_offgrid(self, tile):
+        for chunk in self.chunks_in_rect(self.offgrid_rect(tile)):
+            self.chunks.pop(chunk, None)
+        self.offgrid_index = None
+
+    def tile_at(self, pos):
+        tile = self.grid.get(pos[0], pos[1])
+        if tile:
+            return {'type' : tile[0], 'variant' : tile[1], 'pos' : [pos[0], pos[1]]}
+
+    def set_tile(self, pos, tile_type, variant, autotile=False):
+        if autotile:
+            variant = self.autotile_variant(pos, tile_type, variant)
+        if self.grid.get(pos[0], pos[1]) == (tile_type, variant):
+            return
+        if self.grid.is_solid(pos[0], pos[1]) != (tile_type in PHYSICS_TILES):
+            self.collision_cache = None
+        self.grid.set(pos[0], pos[1], tile_type, variant)
+        self.invalidate(pos)
+        if autotile:
+            self.autotile_neighbours(pos)
+
+    def remove_tile(self, pos, autotile=False):
+        if self.grid.is_solid(pos[0], pos[1]):
+            self.collision_cache = None
+        if self.grid.remove(pos[0], pos[1]):
+            self.invalidate(pos)
+            if autotile:
+                self.autotile_neighbours(pos)
+            return True
+        return False
+
+    def add_offgrid(self, tile):
+        self.offgrid_tiles.append(tile)
+        # the chunk index is kept up to date rather than rebuilt, editing drags add and remove every frame
+        for chunk in self.chunks_in_rect(self.offgrid_rect(tile)):
+            self.chunks.pop(chunk, None)
+            if self.offgrid_index is not None:
+                self.offgrid_index.setdefault(chunk, []).append(tile)
+
+    def remove_offgrid(self, tile):
+        self.offgrid_tiles.remove(tile)
+        for chunk in self.chunks_in_rect(self.offgrid_rect(tile)):
+            self.chunks.pop(chunk, None)
+            if self.offgrid_index is not None:
+                self.offgrid_index[chunk].remove(tile)
+
+    def offgrid_at(self, pos):
+        # off-grid tiles under a world position, looked up through the chunk index
+        if self.offgrid_index is None:
+            self.build_offgrid_index()
+        chunk_px = self.chunk_px()
+        return [tile for tile in self.offgrid_index.get((int(pos[0] // chunk_px), int(pos[1] // chunk_px)), []) if self.offgrid_rect(tile).collidepoint(pos)]
+
+    def offgrid_in(self, rect):
+        # off-grid tiles whose position lies inside a world rect
+        if self.offgrid_index is None:
+            self.build_offgrid_index()
+        found = {}
+        for chunk in self.chunks_in_rect(rect):
+            for tile in self.offgrid_index.get(chunk, []):
+                if rect.collidepoint(tile['pos']):
+                    found[id(tile)] = tile
+        return list(found.values())
 
     def extract(self, id_pairs, keep=False):
         matches = []
@@ -30,76 +160,256 @@ class Tilemap:
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.remove_offgrid(tile)
 
-        for loc in self.tilemap.copy():
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
+        for tile_type, variant in id_pairs:
+            for loc in self.grid.find(tile_type, variant):
+                matches.append({'type' : tile_type, 'variant' : variant, 'pos' : [loc[0] * self.tile_size, loc[1] * self.tile_size]})
                 if not keep:
-                    del self.tilemap[loc]
+                    self.remove_tile(loc)
         return matches
 
     def tiles_around(self, pos):
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for offset in NEIGHBOUR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1]) 
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
+            tile = self.tile_at((tile_loc[0] + offset[0], tile_loc[1] + offset[1]))
+            if tile:
+                tiles.append(tile)
         return tiles
     
     def save(self, path):
-        f = open(path, 'w')
-        json.dump({'tilemap' : self.tilemap, 'tile_size' : self.tile_size, 'offgrid' : self.offgrid_tiles}, f)
-        f.close()
-    
+        save_map(path, self.grid, self.tile_size, self.offgrid_tiles)
+
+    def apply_delta(self, record):
+        for x, y, tile_type, variant in record['tiles']:
+            if tile_type is None:
+                self.remove_tile((x, y))
+            else:
+                self.set_tile((x, y), tile_type, variant)
+        for removed in record['offgrid_removed']:
+            for tile in self.offgrid_tiles:
+                if tile['type'] == removed['type'] and tile['variant'] == removed['variant'] and list(tile['pos']) == list(removed['pos']):
+                    self.remove_offgrid(tile)
+                    break
+        for tile in record['offgrid_added']:
+            self.add_offgrid(tile)
+
     def load(self, path):
-        f = open(path, 'r')
-        map_data = json.load(f)
-        f.close()
+        if self.streamer is not None:
+            self.streamer.stop()
+            self.streamer = None
+        if path.endswith(REGION_EXT):
+            # regions come in through stream(), only the resident markers are here up front
+            self.streamer = RegionStreamer(self, path)
+            self.grid = TileGrid(PHYSICS_TILES)
+            self.tile_size = self.streamer.tile_size
+            self.offgrid_tiles = [dict(tile) for tile in self.streamer.resident]
+        elif path.endswith(MAP_EXT):
+            self.grid, self.tile_size, self.offgrid_tiles = read_map(path, PHYSICS_TILES)
+        else:
+            f = open(path, 'r')
+            map_data = json.load(f)
+            f.close()
 
-        self.tilemap = map_data['tilemap']
-        self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+            tiles = []
+            for loc, tile in map_data['tilemap'].items():
+                x, y = loc.split(';')
+                tiles.append((int(x), int(y), tile['type'], tile['variant']))
+            self.grid = TileGrid.from_tiles(tiles, PHYSICS_TILES)
+            self.tile_size = map_data['tile_size']
+            self.offgrid_tiles = map_data['offgrid']
+        if self.streamer is None:
+            # edits autosaved since the last full save
+            for record in read_delta(path):
+                self.apply_delta(record)
+        self.invalidate()
+        self.build_collision_cache()
+
+    def use_level(self, level):
+        # parsed levels stay cached for reuse, so anything the game mutates is copied
+        if self.streamer is not None:
+            self.streamer.stop()
+            self.streamer = None
+        if level.streamed:
+            self.streamer = RegionStreamer(self, level.path)
+        self.grid = level.grid.copy()
+        self.tile_size = level.tile_size
+        self.offgrid_tiles = [dict(tile) for tile in level.offgrid_tiles]
+        self.invalidate()
+        self.collision_cache = level.collision_cache
+
+    def stream(self, rect, velocity=(0, 0)):
+        if self.streamer is not None:
+            self.streamer.update(rect, velocity)
 
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if self.grid.is_solid(tile_loc[0], tile_loc[1]):
+            return self.tile_at(tile_loc)
+
+    def build_collision_cache(self):
+        cache = {}
+        for x, y, w, h in self.grid.solid_spans():
+            rect = pygame.Rect(x * self.tile_size, y * self.tile_size, w * self.tile_size, h * self.tile_size)
+            for cx in range(x - 1, x + w + 1):
+                for cy in range(y - 1, y + h + 1):
+                    cache.setdefault((cx, cy), []).append(rect)
+        self.collision_cache = {loc : tuple(rects) for loc, rects in cache.items()}
 
     def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
-        return rects
-
-    def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbours = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' +  str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbours.add(shift)
-            neighbours = tuple(sorted(neighbours))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbours in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbours]
+        if self.collision_cache is None:
+            self.build_collision_cache()
+        return self.collision_cache.get((int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)), ())
 
+    def physics_rects_for(self, positions):
+        # physics_rects_around for an (n, 2) array of positions at once
+        if self.collision_cache is None:
+            self.build_collision_cache()
+        cache = self.collision_cache
+        return [cache.get(loc, ()) for loc in map(tuple, (positions // self.tile_size).astype(int).tolist())]
 
-    def render(self, surf, offset=(0, 0)):
+    def autotile_mask(self, pos, type_id):
+        mask = 0
+        for shift, bit in AUTOTILE_BITS.items():
+            if self.grid.type_at(pos[0] + shift[0], pos[1] + shift[1]) == type_id:
+                mask |= bit
+        return mask
+
+    def autotile_variant(self, pos, tile_type, variant):
+        if tile_type not in AUTOTILE_TYPES or tile_type not in self.grid.type_ids:
+            return variant
+        autotiled = AUTOTILE_VARIANTS[self.autotile_mask(pos, self.grid.type_ids[tile_type])]
+        return int(autotiled) if autotiled >= 0 else variant
+
+    def autotile_neighbours(self, pos):
+        # only the four cells whose mask can change after an edit at pos
+        for shift in AUTOTILE_BITS:
+            loc = (pos[0] + shift[0], pos[1] + shift[1])
+            tile = self.grid.get(loc[0], loc[1])
+            if tile:
+                variant = self.autotile_variant(loc, tile[0], tile[1])
+                if variant != tile[1]:
+                    self.grid.set_variant(loc[0], loc[1], variant)
+                    self.invalidate(loc)
+
+    def autotile(self, bounds=None):
+        # the whole grid, or only the cells inside bounds
+        grid = self.grid
+        gx0, gy0, gx1, gy1 = grid.bounds()
+        if bounds is None:
+            bounds = (gx0, gy0, gx1, gy1)
+        x0, y0 = max(bounds[0], gx0), max(bounds[1], gy0)
+        x1, y1 = min(bounds[2], gx1), min(bounds[3], gy1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        # one cell of context around the area, empty past the edge of the grid
+        padded = grid.read((x0 - 1, y0 - 1, x1 + 1, y1 + 1))[0]
+        cells = grid.variants[y0 - gy0:y1 - gy0, x0 - gx0:x1 - gx0]
+        for tile_type in AUTOTILE_TYPES:
+            if tile_type not in grid.type_ids:
+                continue
+            same = padded == grid.type_ids[tile_type]
+            mask = same[1:-1, 2:] * 1 | same[1:-1, :-2] * 2 | same[:-2, 1:-1] * 4 | same[2:, 1:-1] * 8
+            variants = AUTOTILE_VARIANTS[mask]
+            changed = same[1:-1, 1:-1] & (variants >= 0) & (variants != cells)
+            if not changed.any():
+                continue
+            cells[changed] = variants[changed]
+            # pad to whole chunks so the changed cells reduce to one flag per chunk
+            cx0 = x0 % CHUNK_SIZE
+            cy0 = y0 % CHUNK_SIZE
+            height = -(-(changed.shape[0] + cy0) // CHUNK_SIZE)
+            width = -(-(changed.shape[1] + cx0) // CHUNK_SIZE)
+            blocks = np.zeros((height * CHUNK_SIZE, width * CHUNK_SIZE), dtype=bool)
+            blocks[cy0:cy0 + changed.shape[0], cx0:cx0 + changed.shape[1]] = changed
+            cys, cxs = np.nonzero(blocks.reshape(height, CHUNK_SIZE, width, CHUNK_SIZE).any(axis=(1, 3)))
+            for chunk in zip((cxs + (x0 - cx0) // CHUNK_SIZE).tolist(), (cys + (y0 - cy0) // CHUNK_SIZE).tolist()):
+                self.chunks.pop(chunk, None)
+
+    def write_tiles(self, x, y, types, variants, mask, autotile=False):
+        # one batched edit: grid ids and variants for the cells under mask
+        self.grid.write(x, y, types, variants, mask)
+        self.invalidate_tiles((x, y, x + types.shape[1], y + types.shape[0]))
+        if autotile:
+            self.autotile((x - 1, y - 1, x + types.shape[1] + 1, y + types.shape[0] + 1))
+
+    def fill_rect(self, bounds, tile_type, variant, autotile=False):
+        # tile_type None erases
+        shape = (bounds[3] - bounds[1], bounds[2] - bounds[0])
+        type_id = self.grid.type_id(tile_type) if tile_type is not None else 0
+        self.write_tiles(bounds[0], bounds[1], np.full(shape, type_id, dtype=np.uint8), np.full(shape, variant if type_id else 0, dtype=np.uint8), np.ones(shape, dtype=bool), autotile)
+
+    def flood_fill(self, pos, tile_type, variant, bounds, autotile=False):
+        # fills the cells connected to pos that share its type, without leaving bounds
+        if not (bounds[0] <= pos[0] < bounds[2] and bounds[1] <= pos[1] < bounds[3]):
+            return
+        types = self.grid.read(bounds)[0]
+        region = types == types[pos[1] - bounds[1], pos[0] - bounds[0]]
+        filled = np.zeros_like(region)
+        filled[pos[1] - bounds[1], pos[0] - bounds[0]] = True
+        count = 1
+        while True:
+            grown = filled.copy()
+            grown[1:] |= filled[:-1]
+            grown[:-1] |= filled[1:]
+            grown[:, 1:] |= filled[:, :-1]
+            grown[:, :-1] |= filled[:, 1:]
+            grown &= region
+            new_count = int(np.count_nonzero(grown))
+            if new_count == count:
+                break
+            filled, count = grown, new_count
+        type_id = self.grid.type_id(tile_type) if tile_type is not None else 0
+        self.write_tiles(bounds[0], bounds[1], np.full(filled.shape, type_id, dtype=np.uint8), np.full(filled.shape, variant if type_id else 0, dtype=np.uint8), filled, autotile)
+
+    def copy_tiles(self, bounds):
+        # type names travel with the planes, so a copy can be pasted into another grid
+        types, variants = self.grid.read(bounds)
+        return types, variants, list(self.grid.type_names)
+
+    def paste_tiles(self, pos, clip, autotile=False):
+        types, variants, type_names = clip
+        lut = np.array([0] + [self.grid.type_id(name) for name in type_names[1:]], dtype=np.uint8)
+        self.write_tiles(pos[0], pos[1], lut[types], variants, types != 0, autotile)
+
+    def build_offgrid_index(self):
+        self.offgrid_index = {}
         for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+            for chunk in self.chunks_in_rect(self.offgrid_rect(tile)):
+                self.offgrid_index.setdefault(chunk, []).append(tile)
+
+    def bake_chunk(self, chunk):
+        if self.offgrid_index is None:
+            self.build_offgrid_index()
+
+        chunk_px = self.chunk_px()
+        origin = (chunk[0] * chunk_px, chunk[1] * chunk_px)
+        surf = None
+
+        # off-grid tiles go underneath the grid, same as the unbaked draw order
+        for tile in self.offgrid_index.get(chunk, []):
+            if surf is None:
+                surf = pygame.Surface((chunk_px, chunk_px))
+            surf.blit(self.game.assets[tile['type']][tile['variant']], (math.floor(tile['pos'][0]) - origin[0], math.floor(tile['pos'][1]) - origin[1]))
+
+        for x, y, tile_type, variant in self.grid.cells_in(chunk[0] * CHUNK_SIZE, chunk[1] * CHUNK_SIZE, (chunk[0] + 1) * CHUNK_SIZE, (chunk[1] + 1) * CHUNK_SIZE):
+            if surf is None:
+                surf = pygame.Surface((chunk_px, chunk_px))
+            surf.blit(self.game.assets[tile_type][variant], (x * self.tile_size - origin[0], y * self.tile_size - origin[1]))
+
+        if surf is not None:
+            surf.set_colorkey((0, 0, 0))
+        return surf
+
+    def render(self, surf, offset=(0, 0)):
+        chunk_px = self.chunk_px()
+        blits = []
+        for cx in range(offset[0] // chunk_px, (offset[0] + surf.get_width()) // chunk_px + 1):
+            for cy in range(offset[1] // chunk_px, (offset[1] + surf.get_height()) // chunk_px + 1):
+                if (cx, cy) not in self.chunks:
+                    self.chunks[(cx, cy)] = self.bake_chunk((cx, cy))
+                chunk_surf = self.chunks[(cx, cy)]
+                if chunk_surf is not None:
+                    blits.append((chunk_surf, (cx * chunk_px - offset[0], cy * chunk_px - offset[1])))
+        surf.blits(blits, doreturn=False)
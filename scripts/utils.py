@@ -1,4 +1,6 @@
 import os
+import functools
+
 import pygame
 
 BASE_IMG_PATH = "data/images/"
@@ -14,16 +16,41 @@ def load_images(path):
         images.append(load_image(path + '/' + img_name))
     return images
 
+@functools.lru_cache(maxsize=None)
+def get_font(font, size):
+    return pygame.font.SysFont(font, size)
+
+@functools.lru_cache(maxsize=256)
+def render_text(text, color, size=7, font='Arial'):
+    return get_font(font, size).render(text, False, color)
+
+def mask_bounds(mask):
+    # the rect around every set bit, empty for an empty mask
+    rects = mask.get_bounding_rects()
+    if not rects:
+        return pygame.Rect(0, 0, 0, 0)
+    return rects[0].unionall(rects[1:])
+
 class Animation:
-    def __init__(self, images, img_dur=5, loop=True):
+    def __init__(self, images, img_dur=5, loop=True, frames=None, masks=None, rects=None):
         self.images = images
         self.loop = loop
         self.img_duration = img_dur
         self.done = False
         self.frame = 0
+        # frame and mask tables indexed by [flip][frame], built once and shared by copies
+        if frames is None:
+            frames = (images, [pygame.transform.flip(img, True, False) for img in images])
+        if masks is None:
+            masks = tuple([pygame.mask.from_surface(img) for img in table] for table in frames)
+        if rects is None:
+            rects = tuple([mask_bounds(mask) for mask in table] for table in masks)
+        self.frames = frames
+        self.masks = masks
+        self.rects = rects
 
     def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
+        return Animation(self.images, self.img_duration, self.loop, self.frames, self.masks, self.rects)
     
     def update(self):
         if self.loop:
@@ -33,17 +60,23 @@ class Animation:
             if self.frame >= self.img_duration * len(self.images) - 1:
                 self.done = True
 
-    def img(self):
-        return self.images[int(self.frame / self.img_duration)]
+    def img(self, flip=False):
+        return self.frames[flip][int(self.frame / self.img_duration)]
+
+    def mask(self, flip=False):
+        return self.masks[flip][int(self.frame / self.img_duration)]
+
+    def rect(self, flip=False):
+        return self.rects[flip][int(self.frame / self.img_duration)]
 
 class DamageNumbers:
     def __init__(self, text, pos, ticks=40, color=(255, 255, 255), size=7, font='Arial'):
         self.pos = list(pos)
         self.start_height = pos[1]
-        self.font = pygame.font.SysFont(font, size)
         self.text = text
         self.color = color
         self.ticks = ticks
+        self.surf = render_text('- ' + text, tuple(color), size, font)
     
     def update(self):
         self.pos[1] -= int(self.ticks % 2)
@@ -54,5 +87,4 @@ class DamageNumbers:
 
     def render(self, surf, offset=(0, 0)):
         render_pos = (self.pos[0] - offset[0], self.pos[1] - offset[1])
-        text_surf = self.font.render('- ' + self.text, False, self.color)
-        surf.blit(text_surf, render_pos)
+        surf.blit(self.surf, render_pos)
@@ -0,0 +1,38 @@
+import editor
+
+def make_editor(tmp_path, monkeypatch):
+    monkeypatch.setattr(editor, 'MAP_PATH', str(tmp_path / 'map.json'))
+    return editor.Editor()
+
+def stroke(ed, cells, button=1):
+    # what run() does for a brush drag: begin on mouse down, one change per painted cell, release on mouse up
+    ed.journal.begin()
+    for pos in cells:
+        with ed.change((pos[0], pos[1], pos[0] + 1, pos[1] + 1)):
+            ed.tilemap.set_tile(pos, 'grass', 0, autotile=ed.live_autotile)
+    ed.release(cells[-1], erase=button == 3)
+
+def test_brush_strokes_undo_one_at_a_time(tmp_path, monkeypatch):
+    ed = make_editor(tmp_path, monkeypatch)
+    strokes = [[(x, y) for x in range(4)] for y in range(0, 12, 3)]
+    for cells in strokes:
+        stroke(ed, cells)
+    assert len(ed.journal.done) == len(strokes)
+
+    for i in reversed(range(len(strokes))):
+        ed.journal.undo(ed.tilemap)
+        painted = {(x, y) for x, y, tile_type, variant in ed.tilemap.grid}
+        assert painted == {pos for cells in strokes[:i] for pos in cells}
+
+def test_fill_closes_its_operation(tmp_path, monkeypatch):
+    ed = make_editor(tmp_path, monkeypatch)
+    ed.tool = 'fill'
+    bounds = (0, 0, 4, 4)
+    for tile_type in ('stone', 'grass'):
+        ed.journal.begin()
+        with ed.change(bounds):
+            ed.tilemap.flood_fill((0, 0), tile_type, 0, bounds, autotile=ed.live_autotile)
+        ed.release((0, 0), erase=False)
+    assert len(ed.journal.done) == 2
+    ed.journal.undo(ed.tilemap)
+    assert {tile_type for x, y, tile_type, variant in ed.tilemap.grid} == {'stone'}
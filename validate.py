@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from game import Game
+
+# a run whose 99th percentile tick is slower than this blows the 60 fps frame budget;
+# the single worst tick is reported too, but one scheduler hiccup should not fail a level
+FRAME_BUDGET = 1000 / 60
+
+def random_bot(game, rng):
+    actions = []
+    if rng.random() < 0.05:
+        actions.append('jump')
+    if rng.random() < 0.04:
+        actions.append('attack')
+    if rng.random() < 0.01:
+        actions.append('dash')
+    return (rng.random() < 0.4, rng.random() < 0.6), actions
+
+def hunter_bot(game, rng):
+    # walks at the nearest slime, jumps at walls and slimes above, swings when in reach
+    player = game.player
+    enemies = game.enemies.query(*game.active_region()) or list(game.enemies)
+    if not enemies:
+        return random_bot(game, rng)
+    target = min(enemies, key=lambda enemy: abs(enemy.pos[0] - player.pos[0]) + abs(enemy.pos[1] - player.pos[1]))
+    dx = target.pos[0] - player.pos[0]
+    dy = target.pos[1] - player.pos[1]
+    facing = player.flip == (dx < 0)
+    actions = []
+    if facing and abs(dx) < 28 and abs(dy) < 20:
+        actions.append('attack')
+        return (False, False), actions
+    if player.collisions['left'] or player.collisions['right'] or dy < -24 or rng.random() < 0.02:
+        actions.append('jump')
+    return (dx < 0, dx >= 0), actions
+
+BOTS = {
+    'random' : random_bot,
+    'hunter' : hunter_bot,
+}
+
+def run_job(job):
+    level, seed, ticks, bot, render, batched_physics = job
+    result = {'level' : level, 'seed' : seed, 'ticks' : 0, 'deaths' : 0, 'clear_tick' : None, 'peak_entities' : 0, 'peak_particles' : 0, 'worst_frame' : 0, 'p99_frame' : 0, 'tps' : 0, 'error' : None}
+    try:
+        play(result, Game(rendering=render, audio=False, level=level, batched_physics=batched_physics, seed=seed), BOTS[bot], random.Random(seed), ticks, render)
+    except Exception as e:
+        # a level that crashes the game is a finding too, the other runs carry on
+        result['error'] = repr(e)
+    result['over_budget'] = result['p99_frame'] > FRAME_BUDGET
+    return result
+
+def play(result, game, bot, rng, ticks, render):
+    dead = 0
+    frames = []
+    start = time.perf_counter()
+    for tick in range(ticks):
+        movement, actions = bot(game, rng)
+        game.movement = list(movement)
+        frame_start = time.perf_counter()
+        game.step(actions)
+        if render:
+            game.render()
+        frames.append((time.perf_counter() - frame_start) * 1000)
+        result['ticks'] += 1
+
+        if game.dead and not dead:
+            result['deaths'] += 1
+        dead = game.dead
+        result['peak_entities'] = max(result['peak_entities'], len(game.enemies) + len(game.experiences))
+        result['peak_particles'] = max(result['peak_particles'], len(game.particles) + len(game.sparks))
+        if not len(game.enemies):
+            result['clear_tick'] = tick
+            break
+    result['tps'] = result['ticks'] / (time.perf_counter() - start)
+    frames.sort()
+    result['worst_frame'] = frames[-1]
+    result['p99_frame'] = frames[len(frames) * 99 // 100]
+
+def merge(results):
+    levels = {}
+    for result in results:
+        levels.setdefault(result['level'], []).append(result)
+    report = {}
+    for level, runs in sorted(levels.items()):
+        clears = sorted(run['clear_tick'] for run in runs if run['clear_tick'] is not None)
+        report[level] = {
+            'runs' : len(runs),
+            'clears' : len(clears),
+            'median_clear_tick' : clears[len(clears) // 2] if clears else None,
+            'deaths' : sum(run['deaths'] for run in runs),
+            'peak_entities' : max(run['peak_entities'] for run in runs),
+            'peak_particles' : max(run['peak_particles'] for run in runs),
+            'mean_tps' : sum(run['tps'] for run in runs) / len(runs),
+            'worst_frame' : max(run['worst_frame'] for run in runs),
+            'p99_frame' : max(run['p99_frame'] for run in runs),
+            'over_budget' : [run['seed'] for run in runs if run['over_budget']],
+            'errors' : [run['seed'] for run in runs if run['error']],
+        }
+    return report
+
+def print_report(report):
+    print(f'{"level":>5} {"runs":>5} {"clears":>6} {"clear tick":>10} {"deaths":>6} {"entities":>8} {"particles":>9} {"ticks/s":>8} {"p99 ms":>8} {"worst ms":>8}')
+    for level, stats in report.items():
+        clear_tick = stats['median_clear_tick'] if stats['median_clear_tick'] is not None else '-'
+        line = f'{level:>5} {stats["runs"]:>5} {stats["clears"]:>6} {clear_tick:>10} {stats["deaths"]:>6} {stats["peak_entities"]:>8} {stats["peak_particles"]:>9} {stats["mean_tps"]:>8.0f} {stats["p99_frame"]:>8.2f} {stats["worst_frame"]:>8.2f}'
+        if stats['over_budget']:
+            line += '  over budget: seeds ' + ', '.join(str(seed) for seed in stats['over_budget'])
+        if stats['errors']:
+            line += '  crashed: seeds ' + ', '.join(str(seed) for seed in stats['errors'])
+        print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='play every level headless with a bot across all cores and report per-level metrics')
+    parser.add_argument('--levels', help='comma separated level ids, all of data/maps by default')
+    parser.add_argument('--seeds', type=int, default=8, help='seeded runs per level')
+    parser.add_argument('--ticks', type=int, default=3600, help='tick budget per run, runs stop early once the level is cleared')
+    parser.add_argument('--bot', choices=sorted(BOTS), default='hunter')
+    parser.add_argument('--render', action='store_true', help='also render every frame into the dummy display')
+    parser.add_argument('--batched-physics', action='store_true')
+    parser.add_argument('--processes', type=int, help='worker processes, one per core by default')
+    parser.add_argument('--out', help='write the report and every run to this .json file')
+    args = parser.parse_args()
+
+    if args.levels:
+        levels = [int(level) for level in args.levels.split(',')]
+    else:
+        levels = range(len({os.path.splitext(name)[0] for name in os.listdir('data/maps')}))
+    jobs = [(level, seed, args.ticks, args.bot, args.render, args.batched_physics) for level in levels for seed in range(args.seeds)]
+
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(args.processes)
+    results = pool.map(run_job, jobs, chunksize=1)
+    pool.close()
+    pool.join()
+    report = merge(results)
+    print_report(report)
+    print(f'{len(jobs)} runs in {time.perf_counter() - start:.1f}s')
+
+    if args.out:
+        f = open(args.out, 'w')
+        json.dump({'bot' : args.bot, 'ticks' : args.ticks, 'report' : report, 'runs' : results}, f, indent=1)
+        f.close()
+    if any(stats['over_budget'] or stats['errors'] for stats in report.values()):
+        sys.exit(1)